@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+Measure what loading the custom keystone execution module through the salt
+loader costs, as on each salt-call and salt-ssh run, for the module of a
+baseline revision importing keystoneclient eagerly and for the current one
+importing it on first use.
+
+Each case runs in a fresh interpreter so that nothing is already imported,
+and times the loader call after salt itself was imported:
+
+    baseline    loading the keystone module of the baseline revision
+    lazy        loading the current keystone module
+    first_use   lazy plus the deferred keystoneclient import
+
+Needs salt, keystoneclient and keystoneauth1 in the running interpreter.
+
+Usage::
+
+    python bench/keystone_module_load.py [runs] [baseline revision]
+'''
+from __future__ import absolute_import, print_function
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+MODULE = os.path.join('srv', 'salt', '_modules', 'keystone.py')
+
+LOADER = '''
+import sys, time
+import salt.config, salt.loader
+opts = salt.config.minion_config(None)
+opts.update(file_client='local', cachedir={cachedir!r},
+            module_dirs=[{module_dir!r}])
+start = time.time()
+mods = salt.loader.minion_mods(opts, whitelist=['keystone'])
+assert 'keystone.auth' in mods
+'''
+
+REPORT = '''
+sys.stdout.write(repr(time.time() - start))
+'''
+
+
+def _time(code):
+    with open(os.devnull, 'w') as devnull:
+        return float(subprocess.check_output([sys.executable, '-c', code],
+                                             stderr=devnull))
+
+
+def _module_dir(tmp, name, source):
+    path = os.path.join(tmp, name)
+    os.mkdir(path)
+    with open(os.path.join(path, 'keystone.py'), 'wb') as fp_:
+        fp_.write(source)
+    return path
+
+
+def main(runs=20, baseline='6a49026'):
+    tmp = tempfile.mkdtemp()
+    try:
+        old = subprocess.check_output(
+            ['git', 'show', '{0}:{1}'.format(baseline, MODULE)], cwd=ROOT)
+        with open(os.path.join(ROOT, MODULE), 'rb') as fp_:
+            new = fp_.read()
+
+        def loader(name, source):
+            return LOADER.format(cachedir=os.path.join(tmp, 'cache'),
+                                 module_dir=_module_dir(tmp, name, source))
+
+        cases = (
+            ('baseline', loader('baseline', old) + REPORT),
+            ('lazy', loader('lazy', new) + REPORT),
+            ('first_use', loader('first_use', new) +
+             'mods["keystone.trace_span"].__globals__["_import_keystone"]()' +
+             REPORT),
+        )
+        print('{0:<10} {1:>10} {2:>10}'.format('case', 'min ms',
+                                               'median ms'))
+        for name, code in cases:
+            samples = sorted(_time(code) for _ in range(runs))
+            print('{0:<10} {1:>10.1f} {2:>10.1f}'.format(
+                name, samples[0] * 1000, samples[len(samples) // 2] * 1000))
+    finally:
+        shutil.rmtree(tmp)
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:2]] + sys.argv[2:3])
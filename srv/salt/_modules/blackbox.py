@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+'''
+Load blackbox encrypted files into pillar data.
+
+Files listed in ``keyrings/live/blackbox-files.txt`` are stored in the
+pillar roots as ``<name>.gpg``. Instead of decrypting them to disk before a
+run, pillar SLS files load them with:
+
+.. code-block:: jinja
+
+    {% set accounts = salt['blackbox.import_yaml']('database/accounts.yml') %}
+
+The plaintext never touches the disk: gpg reads the ciphertext from a pipe
+and writes to a pipe. Decrypted data is kept in memory keyed by the hash of
+the ciphertext, so a re-encrypted file is picked up automatically.
+
+The salt loader runs this module again for every pillar it compiles, so
+the cache is kept in a registry in ``sys.modules`` that outlives the
+module. salt-ssh compiles the pillar of each target in a forked worker;
+``bin/salt-deploy`` decrypts every file with ``prime`` before the workers
+fork, so each file is decrypted once per run rather than once per target.
+
+:depends:   - gpg, with a secret key of one of the blackbox admins
+:configuration: The gpg command can be changed with:
+
+    .. code-block:: yaml
+
+        blackbox.gpg: gpg2
+        blackbox.gpg_args:
+          - --homedir
+          - /path/to/gnupg
+'''
+
+# Import Python libs
+from __future__ import absolute_import
+import copy
+import hashlib
+import logging
+import os
+import subprocess
+import sys
+import threading
+import types
+
+# Import Salt libs
+import salt.utils
+from salt.exceptions import CommandExecutionError
+from salt.utils.yamlloader import SaltYamlSafeLoader
+
+# Import third party libs
+import yaml
+
+log = logging.getLogger(__name__)
+
+_REGISTRY = 'blackbox_plaintext'
+
+
+def _registry():
+    '''
+    Return the process wide registry of decrypted data by sha256 of the
+    ciphertext, which survives the loader running this module again
+    '''
+    registry = sys.modules.get(_REGISTRY)
+    if registry is None:
+        registry = types.ModuleType(_REGISTRY)
+        registry.plaintext = {}
+        registry.lock = threading.Lock()
+        registry = sys.modules.setdefault(_REGISTRY, registry)
+    return registry
+
+
+def __virtual__():
+    '''
+    Only load if gpg is available
+    '''
+    if salt.utils.which(__opts__.get('blackbox.gpg', 'gpg')):
+        return 'blackbox'
+    return False
+
+
+def _find(path, saltenv):
+    '''
+    Find the encrypted counterpart of a pillar file in the pillar roots
+    '''
+    for root in __opts__.get('pillar_roots', {}).get(saltenv, []):
+        candidate = os.path.join(root, path + '.gpg')
+        if os.path.isfile(candidate):
+            return candidate
+    raise CommandExecutionError(
+        'Could not find {0}.gpg in the {1} pillar roots'.format(path, saltenv))
+
+
+def _decrypt(ciphertext):
+    '''
+    Decrypt ciphertext with gpg, through pipes only
+    '''
+    cmd = ([__opts__.get('blackbox.gpg', 'gpg'), '--batch', '--quiet'] +
+           list(__opts__.get('blackbox.gpg_args', [])) + ['--decrypt'])
+    proc = subprocess.Popen(cmd, stdin=subprocess.PIPE,
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    plaintext, err = proc.communicate(ciphertext)
+    if proc.returncode != 0:
+        raise CommandExecutionError('gpg failed: {0}'.format(err.strip()))
+    return plaintext
+
+
+def import_yaml(path, saltenv='base', default=None):
+    '''
+    Return the data of a blackbox encrypted YAML file, given the path of its
+    plaintext relative to the pillar roots
+
+    default
+        Returned if the encrypted file does not exist, instead of failing
+
+    CLI Example:
+
+    .. code-block:: bash
+
+        salt-call blackbox.import_yaml openstack/keystone/options.yml
+    '''
+    try:
+        encrypted = _find(path, saltenv)
+    except CommandExecutionError:
+        if default is None:
+            raise
+        return default
+    # every pillar gets its own copy, so rendering one cannot alter another
+    return copy.deepcopy(_load(encrypted))
+
+
+def _load(encrypted):
+    '''
+    Return the data of an encrypted YAML file, decrypting it only if its
+    ciphertext is not in the registry yet
+    '''
+    with salt.utils.fopen(encrypted, 'rb') as fp_:
+        ciphertext = fp_.read()
+    digest = hashlib.sha256(ciphertext).hexdigest()
+
+    registry = _registry()
+    with registry.lock:
+        if digest not in registry.plaintext:
+            log.debug('Decrypting %s (%s)', encrypted, digest)
+            registry.plaintext[digest] = yaml.load(_decrypt(ciphertext),
+                                                   Loader=SaltYamlSafeLoader)
+        return registry.plaintext[digest]
+
+
+def prime(saltenv='base'):
+    '''
+    Decrypt every ``.gpg`` file of the pillar roots into the registry of
+    this process, so that processes forked afterwards, like the salt-ssh
+    workers, find them already decrypted. Returns the primed files.
+
+    CLI Example:
+
+    .. code-block:: bash
+
+        salt-call blackbox.prime
+    '''
+    primed = []
+    for root in __opts__.get('pillar_roots', {}).get(saltenv, []):
+        for dirpath, _, filenames in os.walk(root):
+            for filename in sorted(filenames):
+                if not filename.endswith('.gpg'):
+                    continue
+                encrypted = os.path.join(dirpath, filename)
+                try:
+                    _load(encrypted)
+                except (CommandExecutionError, yaml.YAMLError) as exc:
+                    # import_yaml fails on it later if a pillar needs it
+                    log.warning('Could not prime %s: %s', encrypted, exc)
+                    continue
+                primed.append(os.path.relpath(encrypted, root))
+    return sorted(primed)
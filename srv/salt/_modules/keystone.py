@@ -3,6 +3,7 @@
 Module for handling openstack keystone calls.
 
 :optdepends:    - keystoneclient Python adapter
+                - keystoneauth1 and requests, for the shared HTTP transport
 :configuration: This module is not usable until the following are specified
     either in a pillar or in the minion's config file:
 
@@ -47,25 +48,133 @@ Module for handling openstack keystone calls.
     .. code-block:: bash
 
         salt '*' keystone.project_list profile=openstack1
+
+    Users and projects are always looked up within a single domain, the
+    one passed as ``domain`` or else the configured default:
+
+    .. code-block:: yaml
+
+        keystone.domain: default
+
+    Users, projects, roles and services fetched by the ``*_get`` functions
+    are kept in a bounded LRU cache shared by the whole module. Its size and
+    the time records stay valid can be tuned with:
+
+    .. code-block:: yaml
+
+        keystone.cache_size: 1024
+        keystone.cache_ttl: 300
+
+    When keystoneauth1 is available, all clients talk to keystone through
+    one shared HTTP session per transport configuration, so connections
+    and TLS sessions are reused across calls. The transport is set up
+    with (defaults shown):
+
+    .. code-block:: yaml
+
+        keystone.pool_size: 10
+        keystone.connect_timeout: 5
+        keystone.read_timeout: 60
+        keystone.keepalive: True
+        keystone.cacert: /etc/pki/tls/certs/ca-bundle.crt
+        keystone.cert: /etc/pki/tls/certs/client.crt
+        keystone.key: /etc/pki/tls/private/client.key
+        keystone.warmup: 0
+
+    ``keystone.warmup`` is the number of connections to open ahead of time
+    the first time ``keystone.auth`` is called in a run.
+
+    To find what makes a run slow, module functions, keystone states and
+    HTTP requests can be traced to a JSON lines file, see
+    :py:func:`keystone.trace_timeline`. Tracing is off by default:
+
+    .. code-block:: yaml
+
+        keystone.trace: /var/log/salt/keystone-trace.jsonl
 '''
 
 # Import Python libs
 from __future__ import absolute_import
+import base64
+import collections
+import fnmatch
+import json
 import logging
+import math
+import os
+import socket
+import threading
+import time
+import uuid
 
 # Import Salt Libs
 import salt.ext.six as six
-
-# Import third party libs
-HAS_KEYSTONE = False
+import salt.utils
 try:
-    # pylint: disable=import-error
-    from keystoneclient.v3 import client
-    import keystoneclient.exceptions
-    # pylint: enable=import-error
-    HAS_KEYSTONE = True
+    from salt.utils.decorators.signature import identical_signature_wrapper
 except ImportError:
-    pass
+    # salt < 2017.7
+    from salt.utils.decorators import identical_signature_wrapper
+from salt.ext.six.moves.urllib.error import HTTPError, URLError  # pylint: disable=import-error
+from salt.ext.six.moves.urllib.request import urlopen  # pylint: disable=import-error
+
+# Import third party libs
+# keystoneclient and keystoneauth1 take long to import and this module is
+# loaded on every salt-call, so they are only looked up at load time and
+# imported on first use, see _import_keystone()
+client = None
+keystoneclient = None
+requests = None
+ksa_session = None
+token_endpoint = None
+generic = None
+HAS_SESSION = None
+_IMPORT_LOCK = threading.Lock()
+
+
+def _has_module(name):
+    '''
+    Check whether a top level module can be imported, without importing it
+    '''
+    try:
+        from importlib.util import find_spec
+    except ImportError:
+        import imp
+        try:
+            imp.find_module(name)
+        except ImportError:
+            return False
+        return True
+    return find_spec(name) is not None
+
+HAS_KEYSTONE = _has_module('keystoneclient')
+
+
+def _import_keystone():
+    '''
+    Import keystoneclient, and keystoneauth1 with requests if available
+    '''
+    # pylint: disable=global-statement,import-error,redefined-outer-name
+    global client, keystoneclient, requests, ksa_session, token_endpoint
+    global generic, HAS_SESSION
+    if HAS_SESSION is not None:
+        return
+    with _IMPORT_LOCK:
+        if HAS_SESSION is not None:
+            return
+        from keystoneclient.v3 import client
+        import keystoneclient.exceptions
+        try:
+            import requests
+            import requests.adapters
+            from keystoneauth1 import session as ksa_session
+            from keystoneauth1 import token_endpoint
+            from keystoneauth1.identity import generic
+        except ImportError:
+            HAS_SESSION = False
+        else:
+            HAS_SESSION = True
+    # pylint: enable=global-statement,import-error,redefined-outer-name
 
 log = logging.getLogger(__name__)
 
@@ -82,6 +191,139 @@ def __virtual__():
 __opts__ = {}
 
 
+_TRACE_LOCK = threading.Lock()
+_TRACE_STATE = threading.local()
+
+
+def _trace_file():
+    '''
+    Return the file trace spans are written to, None unless tracing is on
+    '''
+    if 'keystone.trace' not in __context__:
+        __context__['keystone.trace'] = _config_get('trace')
+    return __context__['keystone.trace']
+
+
+def _trace_write(path, record):
+    '''
+    Append a span record to the trace file as a JSON line
+    '''
+    record.update({'pid': os.getpid(),
+                   'thread': threading.current_thread().name})
+    line = json.dumps(record, sort_keys=True, default=str) + '\n'
+    with _TRACE_LOCK:
+        with salt.utils.fopen(path, 'a') as fp_:
+            fp_.write(line)
+
+
+def _trace_parent():
+    '''
+    Return the id of the innermost span open in this thread
+    '''
+    spans = getattr(_TRACE_STATE, 'spans', None)
+    return spans[-1].span_id if spans else None
+
+
+class _Span(object):
+    '''
+    A traced operation, written to the trace file when it ends
+    '''
+    def __init__(self, path, name, attrs):
+        self.path = path
+        self.name = name
+        self.attrs = attrs
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent = None
+        self.start = None
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def __enter__(self):
+        self.parent = _trace_parent()
+        self.start = time.time()
+        _TRACE_STATE.__dict__.setdefault('spans', []).append(self)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        _TRACE_STATE.spans.pop()
+        record = {'name': self.name,
+                  'span_id': self.span_id,
+                  'parent': self.parent,
+                  'start': self.start,
+                  'duration_ms': round((time.time() - self.start) * 1000, 3),
+                  'attrs': self.attrs}
+        if exc_value is not None:
+            record['error'] = '{0}: {1}'.format(exc_type.__name__, exc_value)
+        _trace_write(self.path, record)
+        return False
+
+
+class _NoSpan(object):
+    '''
+    The span returned while tracing is off, doing nothing
+    '''
+    def set(self, **attrs):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+_NO_SPAN = _NoSpan()
+
+
+def trace_span(name, **attrs):
+    '''
+    Return a context manager timing the enclosed block as a trace span named
+    ``name``, nested in the span open around it. Meant for custom states
+    and modules, see :py:func:`keystone.trace_timeline`.
+    '''
+    path = _trace_file()
+    if not path:
+        return _NO_SPAN
+    return _Span(path, name, attrs)
+
+
+def _traced(func):
+    '''
+    Decorate a module function to run in a trace span when tracing is on,
+    keeping its signature for the salt loader
+    '''
+    name = 'keystone.' + func.__name__
+
+    def wrapped(*args, **kwargs):
+        path = _trace_file()
+        if not path:
+            return func(*args, **kwargs)
+        with _Span(path, name, {}):
+            return func(*args, **kwargs)
+    return identical_signature_wrapper(func, wrapped)
+
+
+def _trace_response(response, *args, **kwargs):
+    '''
+    requests response hook recording each HTTP request as a span
+    '''
+    path = _trace_file()
+    if not path:
+        return
+    url = six.moves.urllib.parse.urlsplit(response.request.url)
+    elapsed = response.elapsed.total_seconds()
+    _trace_write(path, {'name': 'http',
+                        'span_id': uuid.uuid4().hex[:16],
+                        'parent': _trace_parent(),
+                        'start': time.time() - elapsed,
+                        'duration_ms': round(elapsed * 1000, 3),
+                        'attrs': {'method': response.request.method,
+                                  'path': url.path,
+                                  'status': response.status_code,
+                                  'bytes': len(response.content)}})
+
+
+@_traced
 def auth(profile=None, **connection_args):
     '''
     Set up keystone credentials. Only intended to be used within Keystone-enabled modules.
@@ -93,16 +335,10 @@ def auth(profile=None, **connection_args):
         salt '*' keystone.auth
     '''
 
-    if profile:
-        prefix = profile + ":keystone."
-    else:
-        prefix = "keystone."
-
-    # look in connection_args first, then default to config file
     def get(key, default=None):
-        return connection_args.get('connection_' + key,
-            __salt__['config.get'](prefix + key, default))
+        return _config_get(key, default, profile, connection_args)
 
+    _import_keystone()
     user = get('user', 'admin')
     password = get('password', 'ADMIN')
     project = get('project', 'admin')
@@ -112,6 +348,29 @@ def auth(profile=None, **connection_args):
     token = get('token')
     endpoint = get('endpoint', 'http://127.0.0.1:35357/v2.0')
 
+    if HAS_SESSION:
+        if token:
+            plugin = token_endpoint.Token(endpoint, token)
+        else:
+            plugin = generic.Password(auth_url=auth_url,
+                                      username=user,
+                                      password=password,
+                                      project_name=project,
+                                      project_id=project_id,
+                                      user_domain_id=get('user_domain_id',
+                                                         'default'),
+                                      project_domain_id=get(
+                                          'project_domain_id', 'default'))
+        transport = _transport(profile, connection_args)
+        sess = ksa_session.Session(auth=plugin,
+                                   session=transport,
+                                   verify=get('cacert') or not insecure,
+                                   cert=_client_cert(profile,
+                                                     connection_args))
+        _warmup(transport, endpoint if token else auth_url,
+                profile, connection_args)
+        return client.Client(session=sess)
+
     if token:
         kwargs = {'token': token,
                   'endpoint': endpoint}
@@ -129,8 +388,305 @@ def auth(profile=None, **connection_args):
     return client.Client(**kwargs)
 
 
+def _config_get(key, default=None, profile=None, connection_args=None):
+    '''
+    Look up a keystone setting in connection_args first, then default to
+    the (profile's) config
+    '''
+    if profile:
+        prefix = profile + ":keystone."
+    else:
+        prefix = "keystone."
+    return (connection_args or {}).get('connection_' + key,
+        __salt__['config.get'](prefix + key, default))
+
+
+def _transport_adapter(timeout, keepalive, pool_size):
+    '''
+    Build an HTTP adapter applying default (connect, read) timeouts and
+    optionally closing connections after each request
+    '''
+    class TransportAdapter(requests.adapters.HTTPAdapter):
+        def send(self, request, **kwargs):
+            if kwargs.get('timeout') is None:
+                kwargs['timeout'] = timeout
+            if not keepalive:
+                request.headers['Connection'] = 'close'
+            return super(TransportAdapter, self).send(request, **kwargs)
+
+    return TransportAdapter(pool_connections=pool_size,
+                            pool_maxsize=pool_size)
+
+
+# Shared requests sessions, keyed by their transport settings
+_TRANSPORTS = {}
+_TRANSPORTS_LOCK = threading.Lock()
+
+
+def _transport_settings(profile=None, connection_args=None):
+    '''
+    Read the HTTP transport settings
+    '''
+    def get(key, default=None):
+        return _config_get(key, default, profile, connection_args)
+
+    return (int(get('pool_size', 10)),
+            float(get('connect_timeout', 5)),
+            float(get('read_timeout', 60)),
+            bool(get('keepalive', True)))
+
+
+def _transport(profile=None, connection_args=None):
+    '''
+    Return the requests session shared by every client using the same
+    transport settings, creating it on first use
+    '''
+    settings = _transport_settings(profile, connection_args)
+    with _TRANSPORTS_LOCK:
+        if settings not in _TRANSPORTS:
+            pool_size, connect_timeout, read_timeout, keepalive = settings
+            transport = requests.Session()
+            adapter = _transport_adapter((connect_timeout, read_timeout),
+                                         keepalive, pool_size)
+            transport.mount('http://', adapter)
+            transport.mount('https://', adapter)
+            if _trace_file():
+                transport.hooks['response'].append(_trace_response)
+            _TRANSPORTS[settings] = transport
+        return _TRANSPORTS[settings]
+
+
+def _client_cert(profile=None, connection_args=None):
+    '''
+    Return the client certificate in the form requests expects, if any
+    '''
+    cert = _config_get('cert', None, profile, connection_args)
+    key = _config_get('key', None, profile, connection_args)
+    if cert and key:
+        return (cert, key)
+    return cert
+
+
+def _warmup(transport, url, profile=None, connection_args=None):
+    '''
+    Open ``keystone.warmup`` connections to keystone in parallel, once per
+    run, so that later calls find them (and their TLS sessions) in the pool
+    '''
+    count = int(_config_get('warmup', 0, profile, connection_args))
+    key = 'keystone.warmup.{0}'.format(url)
+    if count <= 0 or key in __context__:
+        return
+    __context__[key] = True
+    count = min(count, _transport_settings(profile, connection_args)[0])
+    verify = (_config_get('cacert', None, profile, connection_args) or
+              not _config_get('insecure', False, profile, connection_args))
+    cert = _client_cert(profile, connection_args)
+
+    def connect():
+        try:
+            transport.get(url, verify=verify, cert=cert)
+        except requests.RequestException as exc:
+            log.debug('Keystone warmup request to %s failed: %s', url, exc)
+
+    threads = [threading.Thread(target=connect) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+class _RecordCache(object):
+    '''
+    LRU cache of keystone records with a time to live. Records are stored
+    under their id key and can also be found through alias keys, e.g. their
+    name, which are dropped together with the record.
+    '''
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._records = collections.OrderedDict()
+        self._aliases = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            key = self._aliases.get(key, key)
+            try:
+                expires, record, aliases = self._records.pop(key)
+            except KeyError:
+                return None
+            if expires < time.time():
+                self._drop_aliases(key, aliases)
+                return None
+            # re-insert as the most recently used entry
+            self._records[key] = (expires, record, aliases)
+            return record
+
+    def put(self, key, record, aliases=()):
+        with self._lock:
+            self._discard(key)
+            aliases = tuple(aliases)
+            self._records[key] = (time.time() + self.ttl, record, aliases)
+            for alias in aliases:
+                self._aliases[alias] = key
+            while len(self._records) > self.maxsize:
+                old_key, (_, _, old_aliases) = self._records.popitem(last=False)
+                self._drop_aliases(old_key, old_aliases)
+
+    def discard(self, key):
+        with self._lock:
+            self._discard(self._aliases.get(key, key))
+
+    def _discard(self, key):
+        entry = self._records.pop(key, None)
+        if entry is not None:
+            self._drop_aliases(key, entry[2])
+
+    def _drop_aliases(self, key, aliases):
+        for alias in aliases:
+            if self._aliases.get(alias) == key:
+                del self._aliases[alias]
+
+
+_RECORDS = None
+
+
+def _record_cache():
+    '''
+    Return the module wide record cache, creating it on first use
+    '''
+    global _RECORDS  # pylint: disable=global-statement
+    if _RECORDS is None:
+        _RECORDS = _RecordCache(
+            int(__salt__['config.get']('keystone.cache_size', 1024)),
+            int(__salt__['config.get']('keystone.cache_ttl', 300)))
+    return _RECORDS
+
+
+def _cache_scope(profile, connection_args):
+    '''
+    Identify the keystone a record was fetched from, so that records of
+    different clouds never mix
+    '''
+    return (profile,
+            connection_args.get('connection_endpoint'),
+            connection_args.get('connection_auth_url'))
+
+
+def _cache_get(kind, profile, connection_args, obj_id=None, name=None,
+               domain=None):
+    '''
+    Look up a cached record by id, or by name if no id is given
+    '''
+    scope = _cache_scope(profile, connection_args)
+    if obj_id:
+        return _record_cache().get((scope, kind, 'id', obj_id))
+    if name:
+        return _record_cache().get((scope, kind, 'name', domain, name))
+    return None
+
+
+def _cache_put(kind, record, profile, connection_args, domain=None):
+    '''
+    Store a record under its id, with its name as an alias
+    '''
+    scope = _cache_scope(profile, connection_args)
+    _record_cache().put((scope, kind, 'id', record['id']), record,
+                        aliases=[(scope, kind, 'name', domain, record['name'])])
+
+
+def _cache_discard(kind, profile, connection_args, obj_id=None, name=None,
+                   domain=None):
+    '''
+    Forget a record after it was changed or deleted
+    '''
+    scope = _cache_scope(profile, connection_args)
+    if obj_id:
+        _record_cache().discard((scope, kind, 'id', obj_id))
+    if name:
+        _record_cache().discard((scope, kind, 'name', domain, name))
+
+
+def _domain_id(domain=None, profile=None, connection_args=None, kstone=None):
+    '''
+    Resolve a domain name or id to its id. Without a domain, the configured
+    ``keystone.domain`` is used, so that name lookups are always scoped to
+    a single domain. Resolutions are kept in the record cache. Returns None
+    if the domain does not exist.
+    '''
+    connection_args = connection_args or {}
+    if domain is None:
+        domain = _config_get('domain', 'default', profile, connection_args)
+    record = (_cache_get('domain', profile, connection_args, obj_id=domain) or
+              _cache_get('domain', profile, connection_args, name=domain))
+    if record is not None:
+        return record['id']
+
+    if kstone is None:
+        kstone = auth(profile, **connection_args)
+    found = None
+    for item in kstone.domains.list(name=domain):
+        if item.name == domain:
+            found = item
+            break
+    if found is None:
+        try:
+            found = kstone.domains.get(domain)
+        except keystoneclient.exceptions.NotFound:
+            return None
+    _cache_put('domain', {'id': found.id, 'name': found.name},
+               profile, connection_args)
+    return found.id
+
+
+def _find_named(manager, name, domain_id):
+    '''
+    Find a user or project by name within one domain, letting keystone do
+    the filtering instead of listing every object
+    '''
+    for item in manager.list(domain=domain_id, name=name):
+        if item.name == name:
+            return item
+    return None
+
+
+def _index(manager, domain_ids, **filters):
+    '''
+    Index users or projects of the given domains by (domain_id, name),
+    with one listing per domain
+    '''
+    ret = {}
+    for domain_id in domain_ids:
+        for item in manager.list(domain=domain_id, **filters):
+            ret[(domain_id, item.name)] = item
+    return ret
+
+
+@_traced
+def domain_list(profile=None, **connection_args):
+    '''
+    Return a list of available domains (keystone domain-list)
+
+    CLI Example:
+
+    .. code-block:: bash
+
+        salt '*' keystone.domain_list
+    '''
+    kstone = auth(profile, **connection_args)
+    ret = {}
+    for domain in kstone.domains.list():
+        ret[domain.name] = {'id': domain.id,
+                            'name': domain.name,
+                            'enabled': domain.enabled}
+        _cache_put('domain', {'id': domain.id, 'name': domain.name},
+                   profile, connection_args)
+    return ret
+
+
+@_traced
 def ec2_credentials_create(user_id=None, name=None,
-                           project_id=None, project=None,
+                           project_id=None, project=None, domain=None,
                            profile=None, **connection_args):
     '''
     Create EC2-compatible credentials for user per project
@@ -147,14 +703,15 @@ project_id=722787eb540849158668370dc627ec5f
     kstone = auth(profile, **connection_args)
 
     if name:
-        user_id = user_get(name=name, profile=profile,
-                           **connection_args)[name]['id']
+        user_id = user_get(name=name, domain=domain, profile=profile,
+                           **connection_args).get(name, {}).get('id')
     if not user_id:
         return {'Error': 'Could not resolve User ID'}
 
     if project:
-        project_id = project_get(name=project, profile=profile,
-                               **connection_args)[project]['id']
+        project_id = project_get(name=project, domain=domain,
+                                 profile=profile, **connection_args
+                                 ).get(project, {}).get('id')
     if not project_id:
         return {'Error': 'Could not resolve Tenant ID'}
 
@@ -165,8 +722,9 @@ project_id=722787eb540849158668370dc627ec5f
             'user_id': newec2.user_id}
 
 
+@_traced
 def ec2_credentials_delete(user_id=None, name=None, access_key=None,
-                           profile=None, **connection_args):
+                           domain=None, profile=None, **connection_args):
     '''
     Delete EC2-compatible credentials
 
@@ -182,7 +740,8 @@ access_key=5f66d2f24f604b8bb9cd28886106f442
     kstone = auth(profile, **connection_args)
 
     if name:
-        user_id = user_get(name=name, profile=None, **connection_args)[name]['id']
+        user_id = user_get(name=name, domain=domain, profile=profile,
+                           **connection_args).get(name, {}).get('id')
     if not user_id:
         return {'Error': 'Could not resolve User ID'}
     kstone.ec2.delete(user_id, access_key)
@@ -190,8 +749,9 @@ access_key=5f66d2f24f604b8bb9cd28886106f442
                                                               user_id)
 
 
+@_traced
 def ec2_credentials_get(user_id=None, name=None, access=None,
-                        profile=None, **connection_args):
+                        domain=None, profile=None, **connection_args):
     '''
     Return ec2_credentials for a user (keystone ec2-credentials-get)
 
@@ -206,10 +766,8 @@ def ec2_credentials_get(user_id=None, name=None, access=None,
     kstone = auth(profile, **connection_args)
     ret = {}
     if name:
-        for user in kstone.users.list():
-            if user.name == name:
-                user_id = user.id
-                break
+        user_id = user_get(name=name, domain=domain, profile=profile,
+                           **connection_args).get(name, {}).get('id')
     if not user_id:
         return {'Error': 'Unable to resolve user id'}
     if not access:
@@ -223,8 +781,9 @@ def ec2_credentials_get(user_id=None, name=None, access=None,
     return ret
 
 
-def ec2_credentials_list(user_id=None, name=None, profile=None,
-                         **connection_args):
+@_traced
+def ec2_credentials_list(user_id=None, name=None, domain=None,
+                         profile=None, **connection_args):
     '''
     Return a list of ec2_credentials for a specific user (keystone ec2-credentials-list)
 
@@ -239,10 +798,8 @@ def ec2_credentials_list(user_id=None, name=None, profile=None,
     kstone = auth(profile, **connection_args)
     ret = {}
     if name:
-        for user in kstone.users.list():
-            if user.name == name:
-                user_id = user.id
-                break
+        user_id = user_get(name=name, domain=domain, profile=profile,
+                           **connection_args).get(name, {}).get('id')
     if not user_id:
         return {'Error': 'Unable to resolve user id'}
     for ec2_credential in kstone.ec2.list(user_id):
@@ -253,6 +810,7 @@ def ec2_credentials_list(user_id=None, name=None, profile=None,
     return ret
 
 
+@_traced
 def endpoint_get(service, profile=None, **connection_args):
     '''
     Return a specific endpoint (keystone endpoint-get)
@@ -275,6 +833,7 @@ def endpoint_get(service, profile=None, **connection_args):
     return {'Error': 'Could not find endpoint for the specified service'}
 
 
+@_traced
 def endpoint_list(profile=None, **connection_args):
     '''
     Return a list of available endpoints (keystone endpoints-list)
@@ -296,6 +855,7 @@ def endpoint_list(profile=None, **connection_args):
     return ret
 
 
+@_traced
 def endpoint_create(service, publicurl=None, internalurl=None, adminurl=None,
                     region=None, profile=None, **connection_args):
     '''
@@ -319,6 +879,7 @@ def endpoint_create(service, publicurl=None, internalurl=None, adminurl=None,
     return endpoint_get(service, profile, **connection_args)
 
 
+@_traced
 def endpoint_delete(service, profile=None, **connection_args):
     '''
     Delete endpoints of an Openstack service
@@ -343,6 +904,7 @@ def endpoint_delete(service, profile=None, **connection_args):
         return True
 
 
+@_traced
 def role_create(name, profile=None, **connection_args):
     '''
     Create a named role.
@@ -361,6 +923,7 @@ def role_create(name, profile=None, **connection_args):
     return role_get(name=name, profile=profile, **connection_args)
 
 
+@_traced
 def role_delete(role_id=None, name=None, profile=None,
                 **connection_args):
     '''
@@ -383,14 +946,15 @@ def role_delete(role_id=None, name=None, profile=None,
                 break
     if not role_id:
         return {'Error': 'Unable to resolve role id'}
-    role = role_get(role_id, profile=profile, **connection_args)
-    kstone.roles.delete(role)
+    kstone.roles.delete(role_id)
+    _cache_discard('role', profile, connection_args, obj_id=role_id)
     ret = 'Role ID {0} deleted'.format(role_id)
     if name:
         ret += ' ({0})'.format(name)
     return ret
 
 
+@_traced
 def role_get(role_id=None, name=None, profile=None, **connection_args):
     '''
     Return a specific roles (keystone role-get)
@@ -403,21 +967,30 @@ def role_get(role_id=None, name=None, profile=None, **connection_args):
         salt '*' keystone.role_get role_id=c965f79c4f864eaaa9c3b41904e67082
         salt '*' keystone.role_get name=nova
     '''
+    record = _cache_get('role', profile, connection_args,
+                        obj_id=role_id, name=name)
+    if record is not None:
+        return {record['name']: record}
     kstone = auth(profile, **connection_args)
-    ret = {}
+    role = None
     if name:
-        for role in kstone.roles.list():
-            if role.name == name:
-                role_id = role.id
+        for item in kstone.roles.list():
+            if item.name == name:
+                role = item
                 break
-    if not role_id:
+        if role is None:
+            return {'Error': 'Unable to resolve role id'}
+    elif not role_id:
         return {'Error': 'Unable to resolve role id'}
-    role = kstone.roles.get(role_id)
-    ret[role.name] = {'id': role.id,
-                      'name': role.name}
-    return ret
+    else:
+        role = kstone.roles.get(role_id)
+    record = {'id': role.id,
+              'name': role.name}
+    _cache_put('role', record, profile, connection_args)
+    return {role.name: record}
 
 
+@_traced
 def role_list(profile=None, **connection_args):
     '''
     Return a list of available roles (keystone role-list)
@@ -436,6 +1009,7 @@ def role_list(profile=None, **connection_args):
     return ret
 
 
+@_traced
 def service_create(name, service_type, description=None, profile=None,
                    **connection_args):
     '''
@@ -453,6 +1027,7 @@ def service_create(name, service_type, description=None, profile=None,
     return service_get(service.id, profile=profile, **connection_args)
 
 
+@_traced
 def service_delete(service_id=None, name=None, profile=None, **connection_args):
     '''
     Delete a service from Keystone service catalog
@@ -468,10 +1043,12 @@ def service_delete(service_id=None, name=None, profile=None, **connection_args):
     if name:
         service_id = service_get(name=name, profile=profile,
                                  **connection_args)[name]['id']
-    service = kstone.services.delete(service_id)
+    kstone.services.delete(service_id)
+    _cache_discard('service', profile, connection_args, obj_id=service_id)
     return 'Keystone service ID "{0}" deleted'.format(service_id)
 
 
+@_traced
 def service_get(service_id=None, name=None, profile=None, **connection_args):
     '''
     Return a specific services (keystone service-get)
@@ -484,23 +1061,32 @@ def service_get(service_id=None, name=None, profile=None, **connection_args):
         salt '*' keystone.service_get service_id=c965f79c4f864eaaa9c3b41904e67082
         salt '*' keystone.service_get name=nova
     '''
+    record = _cache_get('service', profile, connection_args,
+                        obj_id=service_id, name=name)
+    if record is not None:
+        return {record['name']: record}
     kstone = auth(profile, **connection_args)
-    ret = {}
+    service = None
     if name:
-        for service in kstone.services.list():
-            if service.name == name:
-                service_id = service.id
+        for item in kstone.services.list():
+            if item.name == name:
+                service = item
                 break
-    if not service_id:
+        if service is None:
+            return {'Error': 'Unable to resolve service id'}
+    elif not service_id:
         return {'Error': 'Unable to resolve service id'}
-    service = kstone.services.get(service_id)
-    ret[service.name] = {'id': service.id,
-                         'name': service.name,
-                         'type': service.type,
-                         'description': service.description}
-    return ret
+    else:
+        service = kstone.services.get(service_id)
+    record = {'id': service.id,
+              'name': service.name,
+              'type': service.type,
+              'description': getattr(service, 'description', None)}
+    _cache_put('service', record, profile, connection_args)
+    return {service.name: record}
 
 
+@_traced
 def service_list(profile=None, **connection_args):
     '''
     Return a list of available services (keystone services-list)
@@ -521,6 +1107,7 @@ def service_list(profile=None, **connection_args):
     return ret
 
 
+@_traced
 def project_create(name, description=None, enabled=True, domain=None,
                    profile=None, **connection_args):
     '''
@@ -534,12 +1121,17 @@ def project_create(name, description=None, enabled=True, domain=None,
         salt '*' keystone.project_create test enabled=False
     '''
     kstone = auth(profile, **connection_args)
-    new = kstone.projects.create(name, description=description, domain=domain,
-                                 enabled=enabled)
+    domain_id = _domain_id(domain, profile, connection_args, kstone)
+    if domain_id is None:
+        return {'Error': 'Unable to resolve domain "{0}"'.format(domain)}
+    new = kstone.projects.create(name, description=description,
+                                 domain=domain_id, enabled=enabled)
     return project_get(new.id, profile=profile, **connection_args)
 
 
-def project_delete(project_id=None, name=None, profile=None, **connection_args):
+@_traced
+def project_delete(project_id=None, name=None, domain=None, profile=None,
+                   **connection_args):
     '''
     Delete a project (keystone project-delete)
 
@@ -553,13 +1145,12 @@ def project_delete(project_id=None, name=None, profile=None, **connection_args):
     '''
     kstone = auth(profile, **connection_args)
     if name:
-        for project in kstone.projects.list():
-            if project.name == name:
-                project_id = project.id
-                break
+        project_id = project_get(name=name, domain=domain, profile=profile,
+                                 **connection_args).get(name, {}).get('id')
     if not project_id:
         return {'Error': 'Unable to resolve project id'}
     kstone.projects.delete(project_id)
+    _cache_discard('project', profile, connection_args, obj_id=project_id)
     ret = 'Tenant ID {0} deleted'.format(project_id)
     if name:
 
@@ -567,6 +1158,7 @@ def project_delete(project_id=None, name=None, profile=None, **connection_args):
     return ret
 
 
+@_traced
 def project_get(project_id=None, name=None, profile=None, domain=None,
                 **connection_args):
     '''
@@ -579,79 +1171,108 @@ def project_get(project_id=None, name=None, profile=None, domain=None,
         salt '*' keystone.project_get c965f79c4f864eaaa9c3b41904e67082
         salt '*' keystone.project_get project_id=c965f79c4f864eaaa9c3b41904e67082
         salt '*' keystone.project_get name=nova
+        salt '*' keystone.project_get name=nova domain=ldap
     '''
+    domain_id = None
+    if name:
+        domain_id = _domain_id(domain, profile, connection_args)
+        if domain_id is None:
+            return {'Error': 'Unable to resolve domain "{0}"'.format(domain)}
+    record = _cache_get('project', profile, connection_args,
+                        obj_id=project_id, name=name, domain=domain_id)
+    if record is not None:
+        return {record['name']: record}
     kstone = auth(profile, **connection_args)
-    ret = {}
     if name:
-        for project in kstone.projects.list(domain=domain):
-            if project.name == name:
-                project_id = project.id
-                break
-    if not project_id:
+        project = _find_named(kstone.projects, name, domain_id)
+        if project is None:
+            return {'Error': 'Unable to resolve project id'}
+    elif not project_id:
         return {'Error': 'Unable to resolve project id'}
-    project = kstone.projects.get(project_id)
-    ret[project.name] = {'id': project.id,
-                         'name': project.name,
-                         'description': project.description,
-                         'enabled': project.enabled}
-    return ret
+    else:
+        project = kstone.projects.get(project_id)
+    record = _project_record(project)
+    _cache_put('project', record, profile, connection_args,
+               domain=record['domain_id'])
+    return {project.name: record}
+
 
+def _project_record(project):
+    '''
+    Format a keystone project as returned by this module
+    '''
+    return {'id': project.id,
+            'name': project.name,
+            'domain_id': getattr(project, 'domain_id', None),
+            'description': getattr(project, 'description', None),
+            'enabled': project.enabled}
 
+
+@_traced
 def project_list(domain=None, profile=None, **connection_args):
     '''
-    Return a list of available projects (keystone projects-list)
+    Return a list of available projects (keystone projects-list) in a domain,
+    the configured default domain if none is given
 
     CLI Example:
 
     .. code-block:: bash
 
         salt '*' keystone.project_list
+        salt '*' keystone.project_list domain=ldap
     '''
     kstone = auth(profile, **connection_args)
+    domain_id = _domain_id(domain, profile, connection_args, kstone)
+    if domain_id is None:
+        return {'Error': 'Unable to resolve domain "{0}"'.format(domain)}
     ret = {}
-    for project in kstone.projects.list(domain=domain):
-        ret[project.name] = {'id': project.id,
-                            'name': project.name,
-                            'description': project.description,
-                            'enabled': project.enabled}
+    for (_, name), project in six.iteritems(_index(kstone.projects,
+                                                   [domain_id])):
+        ret[name] = _project_record(project)
     return ret
 
 
+@_traced
 def project_update(project_id=None, name=None, description=None,
                    domain=None, enabled=None, profile=None,
                    **connection_args):
     '''
     Update a project's information (keystone project-update)
-    The following fields may be updated: name, email, enabled.
-    Can only update name if targeting by ID
+    The following fields may be updated: name, description, enabled.
+    Can only update name if targeting by ID. Only the fields that are
+    passed are sent, in a single request.
 
     CLI Examples:
 
     .. code-block:: bash
 
         salt '*' keystone.project_update name=admin enabled=True
-        salt '*' keystone.project_update c965f79c4f864eaaa9c3b41904e67082 name=admin email=admin@domain.com
+        salt '*' keystone.project_update c965f79c4f864eaaa9c3b41904e67082 name=admin description='Admin Project'
     '''
     kstone = auth(profile, **connection_args)
     if not project_id:
-        for project in kstone.projects.list():
-            if project.name == name:
-                project_id = project.id
-                break
-    if not project_id:
-        return {'Error': 'Unable to resolve project id'}
-
-    project = kstone.projects.get(project_id)
-    if not name:
-        name = project.name
-    if not description:
-        description = project.description
-    if enabled is None:
-        enabled = project.enabled
-    kstone.projects.update(project_id, name=name, domain=domain,
-                           description=description, enabled=enabled)
-
-
+        domain_id = _domain_id(domain, profile, connection_args, kstone)
+        if domain_id is None:
+            return {'Error': 'Unable to resolve domain "{0}"'.format(domain)}
+        project = _find_named(kstone.projects, name, domain_id)
+        if project is None:
+            return {'Error': 'Unable to resolve project id'}
+        project_id = project.id
+        # name was only used to find the project
+        name = None
+
+    fields = dict((key, value) for key, value in (('name', name),
+                                                   ('description', description),
+                                                   ('enabled', enabled))
+                  if value is not None)
+    if not fields:
+        return 'Nothing to update for project ID {0}'.format(project_id)
+    kstone.projects.update(project_id, **fields)
+    _cache_discard('project', profile, connection_args, obj_id=project_id)
+    return 'Info updated for project ID {0}'.format(project_id)
+
+
+@_traced
 def token_get(profile=None, **connection_args):
     '''
     Return the configured tokens (keystone token-get)
@@ -670,31 +1291,32 @@ def token_get(profile=None, **connection_args):
             'project_id': token['project_id']}
 
 
+@_traced
 def user_list(default_project=None, domain=None,
               profile=None, **connection_args):
     '''
-    Return a list of available users (keystone user-list)
+    Return a list of available users (keystone user-list) in a domain, the
+    configured default domain if none is given
 
     CLI Example:
 
     .. code-block:: bash
 
         salt '*' keystone.user_list
+        salt '*' keystone.user_list domain=ldap
     '''
     kstone = auth(profile, **connection_args)
+    domain_id = _domain_id(domain, profile, connection_args, kstone)
+    if domain_id is None:
+        return {'Error': 'Unable to resolve domain "{0}"'.format(domain)}
     ret = {}
-    for user in kstone.users.list(default_project=default_project,
-                                  domain=domain):
-        ret[user.name] = {'id': user.id,
-                          'name': user.name,
-                          'email': user.email,
-                          'enabled': user.enabled}
-        project_id = getattr(user, 'projectId', None)
-        if project_id:
-            ret[user.name]['project_id'] = project_id
+    for (_, name), user in six.iteritems(_index(
+            kstone.users, [domain_id], default_project=default_project)):
+        ret[name] = _user_record(user)
     return ret
 
 
+@_traced
 def user_get(user_id=None, name=None, domain=None,
              profile=None, **connection_args):
     '''
@@ -707,33 +1329,58 @@ def user_get(user_id=None, name=None, domain=None,
         salt '*' keystone.user_get c965f79c4f864eaaa9c3b41904e67082
         salt '*' keystone.user_get user_id=c965f79c4f864eaaa9c3b41904e67082
         salt '*' keystone.user_get name=nova
+        salt '*' keystone.user_get name=jack domain=ldap
     '''
+    domain_id = None
+    if name:
+        domain_id = _domain_id(domain, profile, connection_args)
+        if domain_id is None:
+            return {'Error': 'Unable to resolve domain "{0}"'.format(domain)}
+    record = _cache_get('user', profile, connection_args,
+                        obj_id=user_id, name=name, domain=domain_id)
+    if record is not None:
+        return {record['name']: record}
     kstone = auth(profile, **connection_args)
-    ret = {}
     if name:
-        for user in kstone.users.list(domain=domain):
-            if user.name == name:
-                user_id = user.id
-                break
-    if not user_id:
+        user = _find_named(kstone.users, name, domain_id)
+        if user is None:
+            return {'Error': 'Unable to resolve user id'}
+    elif not user_id:
         return {'Error': 'Unable to resolve user id'}
-    try:
-        user = kstone.users.get(user_id)
-    except keystoneclient.exceptions.NotFound:
-        msg = 'Could not find user \'{0}\''.format(user_id)
-        log.error(msg)
-        return {'Error': msg}
-
-    ret[user.name] = {'id': user.id,
-                      'name': user.name,
-                      'email': user.email,
-                      'enabled': user.enabled}
-    project_id = getattr(user, 'projectId', None)
+    else:
+        try:
+            user = kstone.users.get(user_id)
+        except keystoneclient.exceptions.NotFound:
+            msg = 'Could not find user \'{0}\''.format(user_id)
+            log.error(msg)
+            return {'Error': msg}
+
+    record = _user_record(user)
+    _cache_put('user', record, profile, connection_args,
+               domain=record['domain_id'])
+    return {user.name: record}
+
+
+def _user_record(user):
+    '''
+    Format a keystone user as returned by this module
+    '''
+    ret = {'id': user.id,
+           'name': user.name,
+           'domain_id': getattr(user, 'domain_id', None),
+           'email': getattr(user, 'email', None),
+           'enabled': user.enabled}
+    # v2 style users carry projectId, v3 ones default_project_id, and users
+    # created with a project_id keep it as an extra attribute
+    project_id = (getattr(user, 'projectId', None) or
+                  getattr(user, 'default_project_id', None) or
+                  getattr(user, 'project_id', None))
     if project_id:
-        ret[user.name]['project_id'] = project_id
+        ret['project_id'] = project_id
     return ret
 
 
+@_traced
 def user_create(name, password, email, project_id=None, domain=None,
                 enabled=True, profile=None, **connection_args):
     '''
@@ -746,16 +1393,21 @@ def user_create(name, password, email, project_id=None, domain=None,
         salt '*' keystone.user_create name=jack password=zero email=jack@halloweentown.org project_id=a28a7b5a999a455f84b1f5210264375e enabled=True
     '''
     kstone = auth(profile, **connection_args)
+    domain_id = _domain_id(domain, profile, connection_args, kstone)
+    if domain_id is None:
+        return {'Error': 'Unable to resolve domain "{0}"'.format(domain)}
     item = kstone.users.create(name=name,
                                password=password,
                                email=email,
-                               domain=None,
+                               domain=domain_id,
                                project_id=project_id,
                                enabled=enabled)
     return user_get(item.id, profile=profile, **connection_args)
 
 
-def user_delete(user_id=None, name=None, profile=None, **connection_args):
+@_traced
+def user_delete(user_id=None, name=None, domain=None, profile=None,
+                **connection_args):
     '''
     Delete a user (keystone user-delete)
 
@@ -769,13 +1421,12 @@ def user_delete(user_id=None, name=None, profile=None, **connection_args):
     '''
     kstone = auth(profile, **connection_args)
     if name:
-        for user in kstone.users.list():
-            if user.name == name:
-                user_id = user.id
-                break
+        user_id = user_get(name=name, domain=domain, profile=profile,
+                           **connection_args).get(name, {}).get('id')
     if not user_id:
         return {'Error': 'Unable to resolve user id'}
     kstone.users.delete(user_id)
+    _cache_discard('user', profile, connection_args, obj_id=user_id)
     ret = 'User ID {0} deleted'.format(user_id)
     if name:
 
@@ -783,6 +1434,7 @@ def user_delete(user_id=None, name=None, profile=None, **connection_args):
     return ret
 
 
+@_traced
 def user_update(user_id=None, name=None, email=None, password=None,
                 enabled=None, domain=None, project=None, profile=None,
                 **connection_args):
@@ -790,6 +1442,7 @@ def user_update(user_id=None, name=None, email=None, password=None,
     Update a user's information (keystone user-update)
     The following fields may be updated: name, email, enabled, project.
     Because the name is one of the fields, a valid user id is required.
+    The domain is only used to find the user and the project by name.
 
     CLI Examples:
 
@@ -800,12 +1453,17 @@ def user_update(user_id=None, name=None, email=None, password=None,
     '''
     kstone = auth(profile, **connection_args)
     if not user_id:
-        for user in kstone.users.list(domain=domain):
-            if user.name == name:
-                user_id = user.id
-                break
+        user_id = user_get(name=name, domain=domain, profile=profile,
+                           **connection_args).get(name, {}).get('id')
         if not user_id:
             return {'Error': 'Unable to resolve user id'}
+    project_id = None
+    if project:
+        project_id = project_get(name=project, domain=domain,
+                                 profile=profile, **connection_args
+                                 ).get(project, {}).get('id')
+        if not project_id:
+            return {'Error': 'Unable to resolve project id'}
     user = kstone.users.get(user_id)
     # Keep previous settings if not updating them
     if not name:
@@ -815,15 +1473,48 @@ def user_update(user_id=None, name=None, email=None, password=None,
     if enabled is None:
         enabled = user.enabled
     kstone.users.update(user=user_id, name=name, email=email,
-                        password=password, domain=domain,
-                        default_project=project, enabled=enabled)
+                        password=password, default_project=project_id,
+                        enabled=enabled)
+    _cache_discard('user', profile, connection_args, obj_id=user_id)
     ret = 'Info updated for user ID {0}'.format(user_id)
     return ret
 
 
+def _resolve_user_project_role(user_id, user, project_id, project,
+                               role_id, role, domain=None, profile=None,
+                               **connection_args):
+    '''
+    Resolve the (id, name) pairs of a user, project and role given either
+    or both of them. Lookups go through the record cache, so repeated role
+    operations on the same objects do not hit keystone again. Users and
+    projects are looked up by name within the given domain.
+    '''
+    ret = {}
+    for kind, obj_id, name, getter in (('user', user_id, user, user_get),
+                                       ('project', project_id, project,
+                                        project_get),
+                                       ('role', role_id, role, role_get)):
+        if not (obj_id or name):
+            return {'Error': 'Unable to resolve {0} id'.format(kind)}
+        if obj_id and name:
+            # the caller already knows both, e.g. from a bulk listing
+            ret[kind] = (obj_id, name)
+            continue
+        kwargs = dict(connection_args)
+        if kind != 'role':
+            kwargs['domain'] = domain
+        found = getter(obj_id, name=name, profile=profile, **kwargs)
+        if 'Error' in found:
+            return {'Error': 'Unable to resolve {0} id'.format(kind)}
+        record = next(six.itervalues(found))
+        ret[kind] = (record['id'], record['name'])
+    return ret
+
+
+@_traced
 def user_role_add(user_id=None, user=None, project_id=None,
-                  project=None, role_id=None, role=None, profile=None,
-                  **connection_args):
+                  project=None, role_id=None, role=None, domain=None,
+                  profile=None, **connection_args):
     '''
     Add role for user in project (keystone user-role-add)
 
@@ -838,41 +1529,24 @@ role_id=ce377245c4ec9b70e1c639c89e8cead4
         salt '*' keystone.user_role_add user=admin project=admin role=admin
     '''
     kstone = auth(profile, **connection_args)
-    if user:
-        user_id = user_get(name=user, profile=profile,
-                           **connection_args)[user]['id']
-    else:
-        user = next(six.iterkeys(user_get(user_id, profile=profile,
-                                          **connection_args)))['name']
-    if not user_id:
-        return {'Error': 'Unable to resolve user id'}
-
-    if project:
-        project_id = project_get(name=project, profile=profile,
-                               **connection_args)[project]['id']
-    else:
-        project = next(six.iterkeys(project_get(project_id, profile=profile,
-                                              **connection_args)))['name']
-    if not project_id:
-        return {'Error': 'Unable to resolve project id'}
-
-    if role:
-        role_id = role_get(name=role, profile=profile,
-                           **connection_args)[role]['id']
-    else:
-        role = next(six.iterkeys(role_get(role_id, profile=profile,
-                                          **connection_args)))['name']
-    if not role_id:
-        return {'Error': 'Unable to resolve role id'}
+    resolved = _resolve_user_project_role(user_id, user, project_id, project,
+                                          role_id, role, domain, profile,
+                                          **connection_args)
+    if 'Error' in resolved:
+        return resolved
+    user_id, user = resolved['user']
+    project_id, project = resolved['project']
+    role_id, role = resolved['role']
 
     kstone.roles.grant(role_id, user=user_id, project=project_id)
     ret_msg = '"{0}" role added for user "{1}" for "{2}" project'
     return ret_msg.format(role, user, project)
 
 
+@_traced
 def user_role_remove(user_id=None, user=None, project_id=None,
                      project=None, role_id=None, role=None,
-                     profile=None, **connection_args):
+                     domain=None, profile=None, **connection_args):
     '''
     Remove role for user in project (keystone user-role-remove)
 
@@ -887,39 +1561,24 @@ role_id=ce377245c4ec9b70e1c639c89e8cead4
         salt '*' keystone.user_role_remove user=admin project=admin role=admin
     '''
     kstone = auth(profile, **connection_args)
-    if user:
-        user_id = user_get(name=user, profile=profile,
-                           **connection_args)[user]['id']
-    else:
-        user = next(six.iterkeys(user_get(user_id, profile=profile,
-                                          **connection_args)))['name']
-    if not user_id:
-        return {'Error': 'Unable to resolve user id'}
-
-    if project:
-        project_id = project_get(name=project, profile=profile,
-                               **connection_args)[project]['id']
-    else:
-        project = next(six.iterkeys(project_get(project_id, profile=profile,
-                                              **connection_args)))['name']
-    if not project_id:
-        return {'Error': 'Unable to resolve project id'}
-
-    if role:
-        role_id = role_get(name=role, profile=profile,
-                           **connection_args)[role]['id']
-    else:
-        role = next(six.iterkeys(role_get(role_id)))['name']
-    if not role_id:
-        return {'Error': 'Unable to resolve role id'}
+    resolved = _resolve_user_project_role(user_id, user, project_id, project,
+                                          role_id, role, domain, profile,
+                                          **connection_args)
+    if 'Error' in resolved:
+        return resolved
+    user_id, user = resolved['user']
+    project_id, project = resolved['project']
+    role_id, role = resolved['role']
 
     kstone.roles.revoke(role=role_id, user=user_id, project=project_id)
     ret_msg = '"{0}" role removed for user "{1}" under "{2}" project'
     return ret_msg.format(role, user, project)
 
 
+@_traced
 def user_role_list(user_id=None, project_id=None, user_name=None,
-                   project_name=None, profile=None, **connection_args):
+                   project_name=None, domain=None, profile=None,
+                   **connection_args):
     '''
     Return a list of available user_roles (keystone user-roles-list)
 
@@ -935,15 +1594,12 @@ project_id=7167a092ece84bae8cead4bf9d15bb3b
     kstone = auth(profile, **connection_args)
     ret = {}
     if user_name:
-        for user in kstone.users.list():
-            if user.name == user_name:
-                user_id = user.id
-                break
+        user_id = user_get(name=user_name, domain=domain, profile=profile,
+                           **connection_args).get(user_name, {}).get('id')
     if project_name:
-        for project in kstone.projects.list():
-            if project.name == project_name:
-                project_id = project.id
-                break
+        project_id = project_get(name=project_name, domain=domain,
+                                 profile=profile, **connection_args
+                                 ).get(project_name, {}).get('id')
     if not user_id or not project_id:
         return {'Error': 'Unable to resolve user or project id'}
     for role in kstone.roles.list(user=user_id, project=project_id):
@@ -954,6 +1610,1314 @@ project_id=7167a092ece84bae8cead4bf9d15bb3b
     return ret
 
 
+@_traced
+def role_assignment_list(user_id=None, project_id=None, profile=None,
+                         **connection_args):
+    '''
+    Return the project role assignments of users as a mapping of user ids
+    to project ids to lists of role ids, using a single request.
+    ``project_id`` may also be a list of project ids, whose assignments are
+    listed with one request each.
+
+    CLI Examples:
+
+    .. code-block:: bash
+
+        salt '*' keystone.role_assignment_list
+        salt '*' keystone.role_assignment_list \
+user_id=298ce377245c4ec9b70e1c639c89e654
+        salt '*' keystone.role_assignment_list \
+project_id='[c965f79c4f864eaaa9c3b41904e67082, 4b0a1fd8b3d84ec9a5d1ad5c41b7e5b1]'
+    '''
+    kstone = auth(profile, **connection_args)
+    if isinstance(project_id, (list, tuple, set)):
+        project_ids = project_id
+    else:
+        project_ids = [project_id]
+    ret = {}
+    for pid in project_ids:
+        for assignment in kstone.role_assignments.list(user=user_id,
+                                                       project=pid):
+            user = getattr(assignment, 'user', {}).get('id')
+            project = getattr(assignment, 'scope', {}).get(
+                'project', {}).get('id')
+            if not user or not project:
+                # group or domain assignments
+                continue
+            ret.setdefault(user, {}).setdefault(project, []).append(
+                assignment.role['id'])
+    return ret
+
+
+def _probe(url, timeout):
+    '''
+    Request an endpoint, returning its HTTP status (None if unreachable)
+    and the time it took to answer
+    '''
+    start = time.time()
+    try:
+        status = urlopen(url, timeout=timeout).getcode()
+    except HTTPError as exc:
+        status = exc.code
+    except (URLError, socket.error) as exc:
+        log.debug('Keystone endpoint %s is not reachable: %s', url, exc)
+        status = None
+    return status, time.time() - start
+
+
+def _wait_endpoints(urls, timeout=60, interval=1):
+    '''
+    Poll endpoints until all answer without a server error, or until the
+    timeout. Returns whether they are healthy and their last statuses.
+    '''
+    deadline = time.time() + timeout
+    statuses = dict((url, None) for url in urls)
+    while True:
+        for url in urls:
+            if statuses[url] is None or statuses[url] >= 500:
+                statuses[url] = _probe(url, max(interval, 1))[0]
+        healthy = all(status is not None and status < 500
+                      for status in statuses.values())
+        if healthy or time.time() >= deadline:
+            return healthy, statuses
+        time.sleep(interval)
+
+
+def _warm_endpoint(url, count, timeout):
+    '''
+    Send ``count`` concurrent requests to an endpoint, so that mod_wsgi
+    spawns and initializes that many daemon processes or threads
+    '''
+    threads = [threading.Thread(target=_probe, args=(url, timeout))
+               for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+@_traced
+def wait_ready(urls=None, timeout=120, max_latency=1, interval=0.5,
+               backoff=2, max_interval=5, warm=0):
+    '''
+    Wait until the keystone endpoints answer without a server error within
+    ``max_latency`` seconds, polling them with an exponential backoff, so
+    that the API calls following a restart do not hit cold WSGI daemons.
+
+    urls
+        The endpoints to poll, by default the public and admin v3 ones
+
+    timeout
+        How long to wait overall, in seconds
+
+    max_latency
+        The response time, in seconds, under which an endpoint is ready
+
+    interval, backoff, max_interval
+        The first pause between polls, the factor it grows by after each
+        poll and its upper bound, in seconds
+
+    warm
+        Once an endpoint answers, send it this many concurrent requests
+        first, e.g. the number of WSGI processes times their threads, so
+        that all of them are spawned before the latency is checked
+
+    CLI Example:
+
+    .. code-block:: bash
+
+        salt '*' keystone.wait_ready
+        salt '*' keystone.wait_ready max_latency=0.2 warm=8
+    '''
+    if urls is None:
+        urls = ['http://localhost:5000/v3', 'http://localhost:35357/v3']
+
+    start = time.time()
+    deadline = start + timeout
+    endpoints = dict((url, {'status': None, 'latency': None}) for url in urls)
+    warmed = set()
+    attempts = 0
+    while True:
+        attempts += 1
+        for url in urls:
+            endpoint = endpoints[url]
+            if endpoint['status'] is not None and endpoint['status'] < 500 \
+                    and endpoint['latency'] <= max_latency:
+                continue
+            status, latency = _probe(url, max(max_latency, interval, 1))
+            if status is not None and status < 500 and url not in warmed \
+                    and warm:
+                _warm_endpoint(url, int(warm), max(max_latency, 1))
+                warmed.add(url)
+                status, latency = _probe(url, max(max_latency, 1))
+            endpoint.update(status=status, latency=round(latency, 3))
+        ready = all(endpoint['status'] is not None and
+                    endpoint['status'] < 500 and
+                    endpoint['latency'] <= max_latency
+                    for endpoint in endpoints.values())
+        if ready or time.time() >= deadline:
+            break
+        time.sleep(min(interval, max(deadline - time.time(), 0)))
+        interval = min(interval * backoff, max_interval)
+
+    ret = {'ready': ready,
+           'endpoints': endpoints,
+           'attempts': attempts,
+           'seconds': round(time.time() - start, 3)}
+    if not ready:
+        ret['Error'] = 'Keystone endpoints are not ready after {0}s'.format(
+            timeout)
+    return ret
+
+
+def _wsgi_daemons(prefix='(wsgi:keystone'):
+    '''
+    Return the pids and start times of the keystone mod_wsgi daemon
+    processes, named after their process group by display-name
+    '''
+    ret = set()
+    for pid in os.listdir('/proc'):
+        if not pid.isdigit():
+            continue
+        try:
+            with salt.utils.fopen('/proc/{0}/cmdline'.format(pid), 'r') as fp_:
+                if not fp_.read().startswith(prefix):
+                    continue
+            with salt.utils.fopen('/proc/{0}/stat'.format(pid), 'r') as fp_:
+                # the start time is the 22nd field, the 20th after the name
+                started = fp_.read().rsplit(')', 1)[1].split()[19]
+        except (IOError, OSError, IndexError):
+            # gone meanwhile
+            continue
+        ret.add((int(pid), started))
+    return ret
+
+
+@_traced
+def wsgi_reload(method='touch', scripts=None, urls=None, timeout=60,
+                interval=1, grace=2):
+    '''
+    Recycle the keystone WSGI daemon processes without a full httpd
+    restart, then wait until the keystone endpoints answer again.
+
+    method
+        ``touch`` updates the modification time of the WSGI scripts, so
+        mod_wsgi recycles the daemon processes once they are idle, without
+        touching httpd itself. ``graceful`` reloads httpd, which also picks
+        up changes of the virtual hosts, letting in-flight requests finish.
+
+    scripts
+        The WSGI scripts to touch, by default those of the keystone-public
+        and keystone-admin process groups
+
+    urls
+        The endpoints to poll, by default the public and admin v3 ones
+
+    grace
+        With ``touch``, the old daemon processes keep answering until
+        mod_wsgi recycles them, so the endpoints are only polled for health
+        once one of them was replaced. Where the daemon processes cannot be
+        found, this many seconds are waited instead.
+
+    CLI Example:
+
+    .. code-block:: bash
+
+        salt '*' keystone.wsgi_reload
+        salt '*' keystone.wsgi_reload method=graceful timeout=120
+    '''
+    if scripts is None:
+        scripts = ['/usr/bin/keystone-wsgi-public',
+                   '/usr/bin/keystone-wsgi-admin']
+    if urls is None:
+        urls = ['http://localhost:5000/v3', 'http://localhost:35357/v3']
+
+    start = time.time()
+    if method == 'touch':
+        old = _wsgi_daemons()
+        for script in scripts:
+            try:
+                os.utime(script, None)
+            except OSError as exc:
+                return {'Error': 'Unable to touch {0}: {1}'.format(script,
+                                                                   exc)}
+        if old:
+            # mod_wsgi checks the scripts on the next request of a daemon
+            deadline = start + timeout
+            while old <= _wsgi_daemons() and time.time() < deadline:
+                for url in urls:
+                    _probe(url, max(interval, 1))
+                time.sleep(interval)
+        else:
+            time.sleep(grace)
+    elif method == 'graceful':
+        if not __salt__['service.reload']('httpd'):
+            return {'Error': 'Unable to reload httpd'}
+    else:
+        return {'Error': 'Unknown reload method "{0}"'.format(method)}
+
+    healthy, statuses = _wait_endpoints(urls, timeout, interval)
+    ret = {'method': method,
+           'healthy': healthy,
+           'endpoints': statuses,
+           'seconds': round(time.time() - start, 3)}
+    if not healthy:
+        ret['Error'] = 'Keystone endpoints are not healthy after {0}s'.format(
+            timeout)
+    return ret
+
+
+def _percentile(samples, percent):
+    '''
+    Nearest-rank percentile of sorted samples
+    '''
+    if not samples:
+        return None
+    rank = int(math.ceil(percent / 100.0 * len(samples))) - 1
+    return round(samples[min(max(rank, 0), len(samples) - 1)], 2)
+
+
+def _bench_operation(http, operation, count, concurrency):
+    '''
+    Run an operation ``count`` times over ``concurrency`` threads, each with
+    its own connection, and summarize latencies in milliseconds
+    '''
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+    remaining = [count]
+
+    def worker():
+        session = http.Session()
+        while True:
+            with lock:
+                if remaining[0] <= 0:
+                    return
+                remaining[0] -= 1
+            start = time.time()
+            try:
+                ok = operation(session)
+            except http.RequestException as exc:
+                ok = False
+                log.debug('Keystone bench request failed: %s', exc)
+            elapsed = (time.time() - start) * 1000
+            with lock:
+                (latencies if ok else errors).append(elapsed)
+
+    threads = [threading.Thread(target=worker)
+               for _ in range(min(concurrency, count))]
+    start = time.time()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.time() - start
+
+    latencies.sort()
+    return {'requests': count,
+            'errors': len(errors),
+            'seconds': round(wall, 3),
+            'throughput': round(len(latencies) / wall, 1) if wall else None,
+            'p50': _percentile(latencies, 50),
+            'p95': _percentile(latencies, 95),
+            'p99': _percentile(latencies, 99),
+            'max': _percentile(latencies, 100)}
+
+
+def bench(url='http://localhost:5000/v3', requests=1000, concurrency=10,
+          user=None, password=None, project=None, domain='default',
+          operations=('issue', 'validate', 'catalog'), output=None,
+          timeout=30, profile=None, **connection_args):
+    '''
+    Run a concurrent load against keystone and report, for each operation,
+    the p50, p95 and p99 latencies in milliseconds and the throughput in
+    requests per second. Operations are token ``issue``, token ``validate``
+    and ``catalog`` fetch; they run one after the other.
+
+    Credentials default to the ``keystone.user``, ``keystone.password`` and
+    ``keystone.project`` settings; the admin token cannot be used since
+    tokens are issued for a real user.
+
+    requests
+        The number of requests per operation
+
+    concurrency
+        The number of concurrent connections
+
+    output
+        A file to also write the results to, as JSON
+
+    timeout
+        The number of seconds to wait for each response; requests timing
+        out count as errors
+
+    CLI Example:
+
+    .. code-block:: bash
+
+        salt '*' keystone.bench
+        salt '*' keystone.bench requests=5000 concurrency=50 output=/tmp/keystone-bench.json
+    '''
+    try:
+        import requests as http  # pylint: disable=import-error
+    except ImportError:
+        return {'Error': 'keystone.bench needs the requests library'}
+
+    def get(key, default=None):
+        return _config_get(key, default, profile, connection_args)
+
+    url = url.rstrip('/')
+    body = {'auth': {
+        'identity': {'methods': ['password'],
+                     'password': {'user': {
+                         'name': user or get('user', 'admin'),
+                         'domain': {'id': domain},
+                         'password': password or get('password', 'ADMIN')}}},
+        'scope': {'project': {'name': project or get('project', 'admin'),
+                              'domain': {'id': domain}}}}}
+
+    timeout = float(timeout)
+    try:
+        response = http.post(url + '/auth/tokens', json=body,
+                             timeout=timeout)
+    except http.RequestException as exc:
+        return {'Error': 'Unable to issue a token: {0}'.format(exc)}
+    if response.status_code != 201:
+        return {'Error': 'Unable to issue a token: HTTP {0} {1}'.format(
+            response.status_code, response.text)}
+    token = response.headers['X-Subject-Token']
+    headers = {'X-Auth-Token': token, 'X-Subject-Token': token}
+
+    available = {
+        'issue': lambda session: session.post(
+            url + '/auth/tokens', json=body,
+            timeout=timeout).status_code == 201,
+        'validate': lambda session: session.get(
+            url + '/auth/tokens', headers=headers,
+            timeout=timeout).status_code == 200,
+        'catalog': lambda session: session.get(
+            url + '/auth/catalog', headers=headers,
+            timeout=timeout).status_code == 200,
+    }
+    if isinstance(operations, six.string_types):
+        operations = operations.split(',')
+    unknown = [name for name in operations if name not in available]
+    if unknown:
+        return {'Error': 'Unknown operations: {0}'.format(', '.join(unknown))}
+
+    ret = {'url': url,
+           'concurrency': int(concurrency),
+           'operations': {}}
+    for name in operations:
+        ret['operations'][name] = _bench_operation(
+            http, available[name], int(requests), int(concurrency))
+
+    if output:
+        with salt.utils.fopen(output, 'w') as fp_:
+            json.dump(ret, fp_, indent=2, sort_keys=True)
+    return ret
+
+
+@_traced
+def memcache_check(servers, timeout=3):
+    '''
+    Check that memcached servers answer, returning a mapping of each
+    ``host:port`` to its memcached version, or False if it does not answer
+
+    CLI Example:
+
+    .. code-block:: bash
+
+        salt '*' keystone.memcache_check '[127.0.0.1:11211]'
+    '''
+    if isinstance(servers, six.string_types):
+        servers = servers.split(',')
+    ret = {}
+    for server in servers:
+        host, _, port = server.strip().rpartition(':')
+        ret[server] = False
+        try:
+            sock = socket.create_connection((host, int(port)), timeout)
+        except (socket.error, ValueError) as exc:
+            log.debug('memcached %s is not reachable: %s', server, exc)
+            continue
+        try:
+            sock.sendall(b'version\r\n')
+            answer = sock.recv(64).decode('ascii', 'replace')
+        except socket.error as exc:
+            log.debug('memcached %s did not answer: %s', server, exc)
+            continue
+        finally:
+            sock.close()
+        if answer.startswith('VERSION '):
+            ret[server] = answer[len('VERSION '):].strip()
+    return ret
+
+
+def _fernet_key():
+    '''
+    Generate a fernet key the way keystone-manage does
+    '''
+    return base64.urlsafe_b64encode(os.urandom(32)).decode('ascii')
+
+
+def fernet_rotate_keys(keys=None, max_active_keys=3):
+    '''
+    Rotate a set of fernet keys, given and returned as a mapping of key
+    indexes to keys, like ``keystone-manage fernet_rotate`` does on disk.
+
+    Key ``0`` is the staged key: it is already accepted by every controller
+    and becomes the primary key (the highest index) on rotation, while a
+    new staged key is generated. The oldest secondary keys are dropped to
+    keep at most ``max_active_keys`` keys.
+
+    Keys are shared through the ``openstack:keystone:fernet:keys`` pillar:
+    store the result in the blackbox encrypted ``fernet.yml`` and apply
+    ``openstack.keystone.fernet`` to all controllers. Because the new
+    primary key was staged everywhere beforehand, tokens it issues validate
+    on every controller even before all of them got the new keys.
+
+    CLI Example:
+
+    .. code-block:: bash
+
+        salt-call --out=yaml keystone.fernet_rotate_keys \
+"$(salt-call --out=json pillar.get openstack:keystone:fernet:keys)"
+    '''
+    ret = dict((int(index), key) for index, key in (keys or {}).items())
+    if not ret:
+        # initial setup: a primary key and a staged one
+        return {0: _fernet_key(), 1: _fernet_key()}
+
+    ret[max(ret) + 1] = ret.pop(0)
+    ret[0] = _fernet_key()
+    secondaries = sorted(index for index in ret if index not in
+                         (0, max(ret)))
+    while len(ret) > max(int(max_active_keys), 2) and secondaries:
+        del ret[secondaries.pop(0)]
+    return ret
+
+
+# exit codes of keystone-manage db_sync --check, and the phases still needed
+_DB_SYNC_PHASES = ['expand', 'migrate', 'contract']
+_DB_SYNC_CHECK = {0: [], 2: _DB_SYNC_PHASES, 3: _DB_SYNC_PHASES[1:],
+                  4: _DB_SYNC_PHASES[2:]}
+
+
+def _keystone_manage(*args, **kwargs):
+    '''
+    Run keystone-manage as the keystone user
+    '''
+    return __salt__['cmd.run_all'](['keystone-manage'] + list(args),
+                                   python_shell=False, runas='keystone',
+                                   **kwargs)
+
+
+# the head of the sqlalchemy-migrate repository of keystone releases without
+# db_sync --check, printed by the python keystone-manage runs with
+_MIGRATE_REPO_HEAD = '''
+import os
+from migrate.versioning import api
+from keystone.common.sql import migrate_repo
+print(api.version(os.path.dirname(migrate_repo.__file__)))
+'''
+
+
+def _migrate_repo_head():
+    '''
+    Return the head version of the migration repository of the installed
+    keystone, or None if it cannot be read
+    '''
+    manage = salt.utils.which('keystone-manage')
+    if not manage:
+        return None
+    with salt.utils.fopen(manage, 'r') as fp_:
+        shebang = fp_.readline()
+    python = shebang[2:].split() if shebang.startswith('#!') else ['python']
+    out = __salt__['cmd.run_all'](python + ['-c', _MIGRATE_REPO_HEAD],
+                                  python_shell=False)
+    if out['retcode'] != 0 or not out['stdout'].strip():
+        log.debug('Unable to read the keystone migration repository: %s',
+                  out['stderr'])
+        return None
+    return out['stdout'].strip().splitlines()[-1]
+
+
+def db_sync_check():
+    '''
+    Return the keystone database migration phases still needed to bring the
+    schema to the head of the installed keystone: a subset of ``expand``,
+    ``migrate`` and ``contract``, empty when the schema is current. With a
+    keystone-manage too old for ``db_sync --check``, e.g. Liberty, the
+    database version is compared with the head of the migration repository
+    instead, and a plain ``sync`` is reported as needed when it is behind.
+
+    CLI Example:
+
+    .. code-block:: bash
+
+        salt '*' keystone.db_sync_check
+    '''
+    out = _keystone_manage('db_sync', '--check')
+    if 'unrecognized arguments' in out['stderr']:
+        version = db_version()
+        head = _migrate_repo_head()
+        if head is None:
+            return {'Error': 'Unable to read the head of the keystone '
+                             'migration repository'}
+        try:
+            # not under version control yet when db_version fails
+            behind = version is None or int(version) < int(head)
+        except ValueError:
+            return {'Error': 'Unexpected keystone database version {0} or '
+                             'migration repository head {1}'.format(version,
+                                                                    head)}
+        return {'phases': ['sync'] if behind else [], 'version': version}
+    if out['retcode'] not in _DB_SYNC_CHECK:
+        return {'Error': 'keystone-manage db_sync --check failed: {0}'.format(
+            out['stderr'] or out['stdout'])}
+    return {'phases': _DB_SYNC_CHECK[out['retcode']], 'version': db_version()}
+
+
+def db_version():
+    '''
+    Return the migration version of the keystone database
+
+    CLI Example:
+
+    .. code-block:: bash
+
+        salt '*' keystone.db_version
+    '''
+    out = _keystone_manage('db_version')
+    if out['retcode'] != 0:
+        return None
+    return out['stdout'].strip()
+
+
+@_traced
+def db_sync(phases=None):
+    '''
+    Run the keystone database migration phases still needed, as found by
+    :py:func:`keystone.db_sync_check <salt.modules.keystone.db_sync_check>`
+    unless ``phases`` is given, and return how long each of them took.
+    Nothing is run when the schema is at head.
+
+    CLI Example:
+
+    .. code-block:: bash
+
+        salt '*' keystone.db_sync
+        salt '*' keystone.db_sync phases='[contract]'
+    '''
+    if phases is None:
+        check = db_sync_check()
+        if 'Error' in check:
+            return check
+        phases = check['phases']
+    ret = {'old': db_version(), 'phases': collections.OrderedDict()}
+    for phase in phases:
+        args = ['db_sync'] if phase == 'sync' else ['db_sync',
+                                                    '--' + phase]
+        start = time.time()
+        out = _keystone_manage(*args)
+        ret['phases'][phase] = round(time.time() - start, 3)
+        if out['retcode'] != 0:
+            ret['Error'] = 'keystone-manage {0} failed: {1}'.format(
+                ' '.join(args), out['stderr'] or out['stdout'])
+            break
+    ret['new'] = db_version()
+    return ret
+
+
+def _run_prune_script(args, script):
+    '''
+    Run the keystone-prune script installed by openstack.keystone.prune and
+    return its JSON report
+    '''
+    cmd = [script] + args
+    out = __salt__['cmd.run_all'](cmd, python_shell=False, runas='keystone')
+    if out['retcode'] != 0:
+        return {'Error': 'Unable to run {0}: {1}'.format(
+            script, out['stderr'] or out['stdout'])}
+    try:
+        return json.loads(out['stdout'])
+    except ValueError:
+        return {'Error': 'Unexpected output of {0}: {1}'.format(
+            script, out['stdout'])}
+
+
+def db_table_sizes(script='/usr/local/bin/keystone-prune'):
+    '''
+    Return the estimated rows and bytes of the keystone token and
+    revocation_event tables
+
+    CLI Example:
+
+    .. code-block:: bash
+
+        salt '*' keystone.db_table_sizes
+    '''
+    ret = _run_prune_script(['--sizes'], script)
+    return ret.get('before', ret)
+
+
+@_traced
+def db_prune(batch_size=1000, sleep=1, revocation_age=86400,
+             script='/usr/local/bin/keystone-prune'):
+    '''
+    Delete expired tokens and revocation events older than
+    ``revocation_age`` seconds, ``batch_size`` rows at a time with ``sleep``
+    seconds between batches, as the scheduled job of
+    openstack.keystone.prune does. Returns the table sizes before and after
+    along with the deleted rows.
+
+    CLI Example:
+
+    .. code-block:: bash
+
+        salt '*' keystone.db_prune
+        salt '*' keystone.db_prune batch_size=5000 sleep=0.2
+    '''
+    return _run_prune_script(['--batch-size', str(batch_size),
+                              '--sleep', str(sleep),
+                              '--revocation-age', str(revocation_age)],
+                             script)
+
+
+def _concurrently(func, items, concurrency=10):
+    '''
+    Call ``func`` on each item over up to ``concurrency`` threads sharing
+    the keystone transport, returning the results in the order of the
+    items. Exceptions are returned as ``{'Error': ...}`` results.
+    '''
+    items = list(items)
+    results = [None] * len(items)
+    lock = threading.Lock()
+    remaining = collections.deque(range(len(items)))
+
+    def worker():
+        while True:
+            with lock:
+                if not remaining:
+                    return
+                index = remaining.popleft()
+            try:
+                results[index] = func(items[index])
+            except Exception as exc:  # pylint: disable=broad-except
+                log.debug('Keystone call on %s failed: %s', items[index], exc)
+                results[index] = {'Error': '{0}: {1}'.format(
+                    type(exc).__name__, exc)}
+
+    threads = [threading.Thread(target=worker)
+               for _ in range(min(max(int(concurrency), 1), len(items)))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+@_traced
+def is_empty(profile=None, **connection_args):
+    '''
+    Return whether keystone holds no role yet, i.e. was never bootstrapped
+
+    CLI Example:
+
+    .. code-block:: bash
+
+        salt '*' keystone.is_empty
+    '''
+    kstone = auth(profile, **connection_args)
+    return not kstone.roles.list()
+
+
+def bootstrap_supported():
+    '''
+    Return whether the installed keystone-manage has the ``bootstrap``
+    command, which came with Mitaka
+
+    CLI Example:
+
+    .. code-block:: bash
+
+        salt '*' keystone.bootstrap_supported
+    '''
+    if 'keystone.bootstrap_supported' not in __context__:
+        out = _keystone_manage('bootstrap', '--help')
+        __context__['keystone.bootstrap_supported'] = out['retcode'] == 0
+    return __context__['keystone.bootstrap_supported']
+
+
+@_traced
+def bootstrap(password, username='admin', project='admin', role='admin',
+              service='keystone', region='RegionOne',
+              admin_url='http://localhost:35357/v3',
+              internal_url='http://localhost:5000/v3',
+              public_url='http://localhost:5000/v3'):
+    '''
+    Seed keystone locally with ``keystone-manage bootstrap``: the admin
+    project, user and role, and the identity service with its endpoints,
+    without any HTTP request or admin token. The password is passed in the
+    environment rather than on the command line.
+
+    CLI Example:
+
+    .. code-block:: bash
+
+        salt '*' keystone.bootstrap password=verybadpass
+    '''
+    start = time.time()
+    out = _keystone_manage(
+        'bootstrap',
+        '--bootstrap-username', username,
+        '--bootstrap-project-name', project,
+        '--bootstrap-role-name', role,
+        '--bootstrap-service-name', service,
+        '--bootstrap-region-id', region,
+        '--bootstrap-admin-url', admin_url,
+        '--bootstrap-internal-url', internal_url,
+        '--bootstrap-public-url', public_url,
+        env={'OS_BOOTSTRAP_PASSWORD': password},
+        output_loglevel='quiet')
+    if out['retcode'] != 0:
+        return {'Error': 'keystone-manage bootstrap failed: {0}'.format(
+            out['stderr'] or out['stdout'])}
+    return {'user': username,
+            'project': project,
+            'role': role,
+            'service': service,
+            'seconds': round(time.time() - start, 3)}
+
+
+@_traced
+def bulk_create(roles=None, projects=None, users=None, services=None,
+                endpoints=None, email=None, domain=None, concurrency=10,
+                profile=None, **connection_args):
+    '''
+    Create the missing roles, projects, services, users, endpoints and role
+    assignments, in that dependency order, with one listing per kind and
+    the requests of each phase sent concurrently over the shared transport.
+    Existing objects are left untouched, the ``*_present`` states take care
+    of their drift. Meant to seed a fresh keystone quickly.
+
+    roles
+        A list of role names
+
+    projects
+        A list of project names, or of dictionaries with a ``name`` and
+        optionally a ``description``
+
+    users
+        A list of users, or a dictionary whose values are users, as for the
+        ``users_present`` state
+
+    services
+        A list of dictionaries with a ``name``, ``service_type`` and
+        ``description``
+
+    endpoints
+        A list of dictionaries with the service ``name``, its
+        ``publicurl``, ``internalurl`` and ``adminurl``, and optionally a
+        ``region``
+
+    email
+        The email address of users that do not set their own
+
+    concurrency
+        The number of requests in flight at once
+
+    CLI Example:
+
+    .. code-block:: bash
+
+        salt '*' keystone.bulk_create roles='[admin, user]' \
+projects='[service, demo]'
+    '''
+    kstone = auth(profile, **connection_args)
+    domain_id = _domain_id(domain, profile, connection_args, kstone)
+    if domain_id is None:
+        return {'Error': 'Unable to resolve domain "{0}"'.format(domain)}
+
+    projects = [project if isinstance(project, dict) else {'name': project}
+                for project in projects or []]
+    if isinstance(users, dict):
+        users = list(users.values())
+    users = users or []
+
+    role_ids = dict((role.name, role.id) for role in kstone.roles.list())
+    project_ids = dict((project.name, project.id) for project
+                       in kstone.projects.list(domain=domain_id))
+    service_ids = dict((service.name, service.id)
+                       for service in kstone.services.list())
+    user_ids = dict((user.name, user.id)
+                    for user in kstone.users.list(domain=domain_id))
+    endpoint_services = set(endpoint.service_id
+                            for endpoint in kstone.endpoints.list())
+
+    ret = {'created': {}, 'errors': [], 'seconds': {}}
+
+    def run(phase, tasks):
+        start = time.time()
+        results = _concurrently(lambda task: task[2](), tasks, concurrency)
+        for (kind, name, _), result in zip(tasks, results):
+            if isinstance(result, dict) and 'Error' in result:
+                ret['errors'].append('{0} "{1}": {2}'.format(
+                    kind, name, result['Error']))
+                continue
+            ret['created'].setdefault(kind, []).append(name)
+            if kind == 'roles':
+                role_ids[name] = result.id
+            elif kind == 'projects':
+                project_ids[name] = result.id
+            elif kind == 'services':
+                service_ids[name] = result.id
+            elif kind == 'users':
+                user_ids[name] = result.id
+        ret['seconds'][phase] = round(time.time() - start, 3)
+
+    # roles, projects and services do not depend on each other
+    tasks = []
+    for role in roles or []:
+        if role not in role_ids:
+            tasks.append(('roles', role,
+                          lambda role=role: kstone.roles.create(role)))
+    for project in projects:
+        if project['name'] not in project_ids:
+            tasks.append(('projects', project['name'],
+                          lambda project=project: kstone.projects.create(
+                              project['name'], domain=domain_id,
+                              description=project.get('description'),
+                              enabled=project.get('enabled', True))))
+    for service in services or []:
+        if service['name'] not in service_ids:
+            tasks.append(('services', service['name'],
+                          lambda service=service: kstone.services.create(
+                              service['name'], service['service_type'],
+                              service.get('description'))))
+    run('roles, projects, services', tasks)
+
+    # users need their project, endpoints their service
+    tasks = []
+    for user in users:
+        if user['name'] not in user_ids:
+            tasks.append(('users', user['name'],
+                          lambda user=user: kstone.users.create(
+                              name=user['name'],
+                              password=user['password'],
+                              email=user.get('email', email),
+                              domain=domain_id,
+                              project_id=project_ids.get(user.get('project')),
+                              enabled=user.get('enabled', True))))
+    for endpoint in endpoints or []:
+        service_id = service_ids.get(endpoint['name'])
+        if service_id is None or service_id in endpoint_services:
+            continue
+        for interface in ('public', 'internal', 'admin'):
+            tasks.append(('endpoints',
+                          '{0} {1}'.format(endpoint['name'], interface),
+                          lambda service_id=service_id, endpoint=endpoint,
+                          interface=interface: kstone.endpoints.create(
+                              service_id, endpoint[interface + 'url'],
+                              interface=interface,
+                              region=endpoint.get('region', 'RegionOne'))))
+    run('users, endpoints', tasks)
+
+    # granting an existing assignment again is harmless
+    tasks = []
+    for user in users:
+        for project, wanted in (user.get('roles') or {}).items():
+            for role in wanted:
+                ids = (role_ids.get(role), user_ids.get(user['name']),
+                       project_ids.get(project))
+                name = '{0}/{1}/{2}'.format(user['name'], project, role)
+                if None in ids:
+                    ret['errors'].append('roles granted "{0}": unknown '
+                                         'user, project or role'.format(name))
+                    continue
+                tasks.append(('roles granted', name,
+                              lambda ids=ids: kstone.roles.grant(
+                                  ids[0], user=ids[1], project=ids[2])))
+    run('role assignments', tasks)
+    return ret
+
+
+def _audit_kind(wanted, live, compare, max_items):
+    '''
+    Compare the wanted and live records of one kind, both by name, into
+    counts and capped lists of missing, extra and drifted names
+    '''
+    missing = sorted(name for name in wanted if name not in live)
+    extra = sorted(name for name in live if name not in wanted)
+    drifted = {}
+    for name in sorted(wanted):
+        if name in live:
+            fields = compare(wanted[name], live[name])
+            if fields:
+                drifted[name] = fields
+    return {'counts': {'wanted': len(wanted),
+                       'live': len(live),
+                       'missing': len(missing),
+                       'extra': len(extra),
+                       'drifted': len(drifted)},
+            'missing': missing[:max_items],
+            'extra': extra[:max_items],
+            'drifted': dict(sorted(drifted.items())[:max_items])}
+
+
+def _audit_fields(pairs):
+    '''
+    Return the differing ones of (field, wanted, live) triples
+    '''
+    return dict((field, {'pillar': wanted, 'live': live})
+                for field, wanted, live in pairs if wanted != live)
+
+
+@_traced
+def audit(pillar='openstack:keystone', domain=None, max_items=50,
+          profile=None, **connection_args):
+    '''
+    Compare the roles, projects, users, services and endpoints of the
+    pillar with live keystone and report what is missing, extra or drifted,
+    with counts and the differing fields. Live data is fetched with one
+    listing per kind, role assignments with one per project users get roles
+    on, and nothing is changed, unlike a ``test=True`` run of the states.
+
+    pillar
+        The pillar key of the keystone settings, holding ``roles``,
+        ``projects``, ``accounts`` and ``credentials``
+
+    domain
+        The domain of the users and projects
+
+    max_items
+        The number of names listed per category, counts are always complete
+
+    CLI Example:
+
+    .. code-block:: bash
+
+        salt '*' keystone.audit
+        salt '*' keystone.audit max_items=0
+    '''
+    settings = __salt__['pillar.get'](pillar, {})
+    if not settings:
+        return {'Error': 'No keystone settings in pillar {0}'.format(pillar)}
+    email = __salt__['pillar.get']('email')
+    args = dict(connection_args, profile=profile)
+    max_items = int(max_items)
+
+    start = time.time()
+    roles = role_list(**args)
+    projects = project_list(domain=domain, **args)
+    users = user_list(domain=domain, **args)
+    services = service_list(**args)
+    endpoints = endpoint_list(**args)
+    for live in (projects, users):
+        if 'Error' in live:
+            return live
+    accounts = settings.get('accounts', {})
+    if isinstance(accounts, dict):
+        accounts = list(accounts.values())
+    # like users_present, only the projects of the pillar are compared
+    assignments = role_assignment_list(
+        project_id=sorted(set(projects[project]['id'] for user in accounts
+                              for project in user.get('roles') or {}
+                              if project in projects)),
+        **args)
+    fetched = time.time() - start
+
+    role_names = dict((role['id'], name) for name, role in roles.items())
+    project_names = dict((project['id'], name)
+                         for name, project in projects.items())
+    ret = {}
+
+    ret['roles'] = _audit_kind(
+        dict((role, {}) for role in settings.get('roles', [])), roles,
+        lambda wanted, live: {}, max_items)
+
+    wanted_projects = dict(
+        (project['name'], project) if isinstance(project, dict)
+        else (project, {'name': project})
+        for project in settings.get('projects', []))
+    ret['projects'] = _audit_kind(
+        wanted_projects, projects,
+        lambda wanted, live: _audit_fields([
+            ('description', wanted.get('description', live['description']),
+             live['description']),
+            ('enabled', wanted.get('enabled', True), live['enabled'])]),
+        max_items)
+
+    def user_drift(wanted, live):
+        wanted_roles = dict((project, sorted(names)) for project, names
+                            in (wanted.get('roles') or {}).items())
+        current_roles = {}
+        for project_id, role_ids in assignments.get(live['id'], {}).items():
+            project = project_names.get(project_id, project_id)
+            if project in wanted_roles:
+                current_roles[project] = sorted(
+                    role_names.get(role_id, role_id) for role_id in role_ids)
+        for project in wanted_roles:
+            current_roles.setdefault(project, [])
+        return _audit_fields([
+            ('email', wanted.get('email', email), live['email']),
+            ('enabled', wanted.get('enabled', True), live['enabled']),
+            ('project', wanted.get('project'),
+             project_names.get(live.get('project_id'), live.get('project_id'))
+             if wanted.get('project') else None),
+            ('roles', wanted_roles, current_roles)])
+
+    ret['users'] = _audit_kind(
+        dict((user['name'], user) for user in accounts), users,
+        user_drift, max_items)
+
+    credentials = settings.get('credentials', {})
+    ret['services'] = _audit_kind(
+        dict((service['name'], service)
+             for service in credentials.get('services', [])), services,
+        lambda wanted, live: _audit_fields([
+            ('type', wanted['service_type'], live['type']),
+            ('description', wanted.get('description'),
+             live['description'])]),
+        max_items)
+
+    live_endpoints = {}
+    service_names = dict((service['id'], name)
+                         for name, service in services.items())
+    for endpoint in endpoints.values():
+        name = service_names.get(endpoint['service_id'])
+        if name:
+            live_endpoints.setdefault(name, {})[endpoint['interface']] = \
+                endpoint['url']
+    ret['endpoints'] = _audit_kind(
+        dict((endpoint['name'], endpoint)
+             for endpoint in credentials.get('endpoints', [])),
+        live_endpoints,
+        lambda wanted, live: _audit_fields([
+            (interface, wanted.get(interface + 'url'), live.get(interface))
+            for interface in ('public', 'internal', 'admin')]),
+        max_items)
+
+    ret['seconds'] = {'fetch': round(fetched, 3),
+                      'total': round(time.time() - start, 3)}
+    return ret
+
+
+def _match_names(names, patterns, candidates):
+    '''
+    Return the sorted candidates matching one of the names or of the shell
+    style patterns
+    '''
+    names = set(names or [])
+    patterns = patterns or []
+    return sorted(candidate for candidate in candidates
+                  if candidate in names or
+                  any(fnmatch.fnmatchcase(candidate, pattern)
+                      for pattern in patterns))
+
+
+@_traced
+def projects_delete(names=None, patterns=None, domain=None, cascade=False,
+                    concurrency=10, test=False, profile=None,
+                    **connection_args):
+    '''
+    Delete the projects of a domain whose name is in ``names`` or matches
+    one of the shell style ``patterns``, resolving all of them with one
+    listing and sending the deletions concurrently. Returns the result of
+    each project by name.
+
+    cascade
+        First revoke the role assignments on these projects, listed per
+        project, and delete their EC2 credentials, found with one listing.
+        Keystone drops the endpoint filters of deleted projects itself.
+
+    concurrency
+        The number of requests in flight at once
+
+    test
+        Only return the projects that would be deleted
+
+    CLI Examples:
+
+    .. code-block:: bash
+
+        salt '*' keystone.projects_delete names='[demo, test]'
+        salt '*' keystone.projects_delete patterns='[ci-*]' cascade=True
+    '''
+    kstone = auth(profile, **connection_args)
+    domain_id = _domain_id(domain, profile, connection_args, kstone)
+    if domain_id is None:
+        return {'Error': 'Unable to resolve domain "{0}"'.format(domain)}
+    ids = dict((project.name, project.id)
+               for project in kstone.projects.list(domain=domain_id))
+    matched = _match_names(names, patterns, ids)
+    if test or not matched:
+        return {'deleted': dict((name, 'Will be deleted')
+                                for name in matched)}
+
+    ret = {'deleted': {}, 'cleanup': {}}
+    if cascade:
+        targets = sorted(set(ids[name] for name in matched))
+        results = _concurrently(
+            lambda project_id: list(kstone.role_assignments.list(
+                project=project_id)),
+            targets, concurrency)
+        revokes = []
+        for project_id, assignments in zip(targets, results):
+            if isinstance(assignments, dict):
+                continue
+            for assignment in assignments:
+                actor = dict((kind, getattr(assignment, kind)['id'])
+                             for kind in ('user', 'group')
+                             if hasattr(assignment, kind))
+                revokes.append(dict(actor, role=assignment.role['id'],
+                                    project=project_id))
+        credentials = [credential.id for credential
+                       in kstone.credentials.list(type='ec2')
+                       if getattr(credential, 'project_id', None) in targets]
+        results += _concurrently(
+            lambda revoke: kstone.roles.revoke(**revoke), revokes,
+            concurrency)
+        ret['cleanup']['role assignments'] = len(revokes)
+        results += _concurrently(kstone.credentials.delete, credentials,
+                                 concurrency)
+        ret['cleanup']['ec2 credentials'] = len(credentials)
+        errors = [result['Error'] for result in results
+                  if isinstance(result, dict) and 'Error' in result]
+        if errors:
+            ret['cleanup']['errors'] = errors
+
+    def delete(name):
+        kstone.projects.delete(ids[name])
+        _cache_discard('project', profile, connection_args, obj_id=ids[name])
+        return 'Deleted'
+
+    ret['deleted'] = dict(zip(matched,
+                              _concurrently(delete, matched, concurrency)))
+    return ret
+
+
+@_traced
+def users_delete(names=None, patterns=None, keep=None, protected=None,
+                 domain=None, concurrency=10, test=False, profile=None,
+                 **connection_args):
+    '''
+    Delete the users of a domain whose name is in ``names`` or matches one
+    of the shell style ``patterns`` or, with ``keep``, every user not in
+    it. Users are resolved with one listing and deleted concurrently.
+    Returns the result of each user by name and their count.
+
+    keep
+        Delete all users except these, e.g. the managed accounts
+
+    protected
+        Names or shell style patterns of users never deleted
+
+    concurrency
+        The number of requests in flight at once
+
+    test
+        Only return the users that would be deleted
+
+    CLI Examples:
+
+    .. code-block:: bash
+
+        salt '*' keystone.users_delete names='[jack, jill]'
+        salt '*' keystone.users_delete patterns='[ci-*]' test=True
+        salt '*' keystone.users_delete keep='[admin, nova]' \
+protected='[svc-*]' test=True
+    '''
+    kstone = auth(profile, **connection_args)
+    domain_id = _domain_id(domain, profile, connection_args, kstone)
+    if domain_id is None:
+        return {'Error': 'Unable to resolve domain "{0}"'.format(domain)}
+    ids = dict((user.name, user.id)
+               for user in kstone.users.list(domain=domain_id))
+    if keep is not None:
+        keep = set(keep)
+        matched = sorted(name for name in ids if name not in keep)
+    else:
+        matched = _match_names(names, patterns, ids)
+    if protected:
+        protected_names = set(_match_names(protected, protected, matched))
+        matched = [name for name in matched if name not in protected_names]
+    if test or not matched:
+        return {'deleted': dict((name, 'Will be deleted')
+                                for name in matched),
+                'count': len(matched)}
+
+    def delete(name):
+        kstone.users.delete(ids[name])
+        _cache_discard('user', profile, connection_args, obj_id=ids[name])
+        return 'Deleted'
+
+    return {'deleted': dict(zip(matched,
+                                _concurrently(delete, matched, concurrency))),
+            'count': len(matched)}
+
+
+def trace_timeline(path=None, min_ms=0):
+    '''
+    Return the spans of a trace file as a timeline, one line per span with
+    its start offset, duration, name and attributes, nested under the span
+    it ran in. Spans shorter than ``min_ms`` milliseconds are left out.
+
+    Tracing is off unless a trace file is set, in the minion config or
+    pillar:
+
+    .. code-block:: yaml
+
+        keystone.trace: /var/log/salt/keystone-trace.jsonl
+
+    Every traced module function, keystone state and HTTP request to
+    keystone then appends a JSON line to this file.
+
+    CLI Example:
+
+    .. code-block:: bash
+
+        salt '*' keystone.trace_timeline
+        salt '*' keystone.trace_timeline min_ms=100
+    '''
+    path = path or _config_get('trace')
+    if not path:
+        return {'Error': 'No trace file, set keystone.trace'}
+    try:
+        with salt.utils.fopen(path, 'r') as fp_:
+            spans = [json.loads(line) for line in fp_ if line.strip()]
+    except (IOError, ValueError) as exc:
+        return {'Error': 'Unable to read {0}: {1}'.format(path, exc)}
+    if not spans:
+        return []
+
+    known = set(span['span_id'] for span in spans)
+    children = collections.defaultdict(list)
+    for span in spans:
+        # spans whose parent is missing, e.g. still open, become roots
+        parent = span.get('parent') if span.get('parent') in known else None
+        children[parent].append(span)
+    origin = min(span['start'] for span in spans)
+    ret = []
+
+    def walk(parent, depth):
+        for span in sorted(children[parent], key=lambda span: span['start']):
+            if span['duration_ms'] >= min_ms:
+                attrs = sorted(span['attrs'].items())
+                if 'error' in span:
+                    attrs.append(('error', span['error']))
+                ret.append('{0:>9.3f}s {1:>10.1f}ms {2}{3}'.format(
+                    span['start'] - origin, span['duration_ms'],
+                    '  ' * depth, ' '.join([span['name']] + [
+                        '{0}={1}'.format(key, value)
+                        for key, value in attrs])))
+            walk(span['span_id'], depth + 1)
+
+    walk(None, 0)
+    return ret
+
+
 def _item_list(profile=None, **connection_args):
     '''
     Template for writing list functions
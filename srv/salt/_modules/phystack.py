@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+'''
+Helpers shared by the phystack formulas.
+
+Map files merge a pillar subtree over the formula defaults. Done in Jinja,
+that merge is repeated by every SLS file importing the map; ``settings``
+does it once per run instead:
+
+.. code-block:: jinja
+
+    {% set keystone = salt['phystack.settings'](
+        'openstack:keystone', 'salt://openstack/keystone/defaults.yml') %}
+
+Likewise, ``pkg_refresh`` refreshes the package metadata at most once per
+run for the ``phystack.packages`` states, and ``wipe_secrets`` cleans up
+salt-ssh targets whose thin is kept between runs.
+'''
+
+# Import Python libs
+from __future__ import absolute_import
+import copy
+import json
+import logging
+import os
+import shutil
+import time
+
+# Import Salt libs
+import salt.ext.six as six
+import salt.utils
+import salt.utils.dictupdate
+from salt.exceptions import CommandExecutionError
+from salt.utils.yamlloader import SaltYamlSafeLoader
+
+# Import third party libs
+import yaml
+
+log = logging.getLogger(__name__)
+
+
+def _merge_settings(context, cache_file, pillar_get, pillar_key, defaults,
+                    saltenv):
+    '''
+    Merge the pillar subtree at ``pillar_key`` over the defaults, memoized
+    in ``context``. Defaults files are fetched with ``cache_file`` and the
+    memo is keyed by the modification time and size of the cached copy, so
+    that an edited file is read again. Shared with the salt-ssh wrapper,
+    which passes its own context and file client.
+    '''
+    if isinstance(defaults, six.string_types):
+        path = cache_file(defaults, saltenv)
+        if not path:
+            raise CommandExecutionError(
+                'Could not read defaults from {0}'.format(defaults))
+        stat = os.stat(path)
+        stamp = '{0}.{1}.{2}'.format(path, stat.st_mtime, stat.st_size)
+    else:
+        path = None
+        stamp = json.dumps(defaults, sort_keys=True, default=str)
+
+    key = 'phystack.settings.{0}.{1}.{2}'.format(saltenv, pillar_key, stamp)
+    if key not in context:
+        log.debug('Merging pillar %s over its defaults', pillar_key)
+        if path:
+            with salt.utils.fopen(path, 'r') as fp_:
+                defaults = yaml.load(fp_, Loader=SaltYamlSafeLoader) or {}
+        context[key] = salt.utils.dictupdate.update(
+            copy.deepcopy(defaults), pillar_get(pillar_key, {}))
+    return context[key]
+
+
+def settings(pillar_key, defaults, saltenv='base'):
+    '''
+    Return the pillar subtree at ``pillar_key`` merged over ``defaults``,
+    which is either a dictionary or the salt:// URL of a YAML file.
+
+    The pillar does not change during a run, so the result is memoized for
+    the rest of the run, keyed by ``pillar_key`` and the defaults, until
+    the defaults file changes. The returned dictionary is shared between
+    callers and must not be modified.
+
+    CLI Example:
+
+    .. code-block:: bash
+
+        salt '*' phystack.settings openstack:keystone salt://openstack/keystone/defaults.yml
+    '''
+    return _merge_settings(
+        __context__,
+        lambda path, saltenv: __salt__['cp.cache_file'](path,
+                                                        saltenv=saltenv),
+        __salt__['pillar.get'], pillar_key, defaults, saltenv)
+
+
+def _refresh_stamp():
+    return os.path.join(__opts__['cachedir'], 'phystack.pkg_refresh')
+
+
+def pkg_refresh(ttl=3600, force=False):
+    '''
+    Refresh the package metadata, unless it was already refreshed during
+    this run or less than ``ttl`` seconds ago. Returns whether it was
+    refreshed.
+
+    CLI Example:
+
+    .. code-block:: bash
+
+        salt '*' phystack.pkg_refresh
+        salt '*' phystack.pkg_refresh force=True
+    '''
+    stamp = _refresh_stamp()
+    if not force:
+        if __context__.get('phystack.pkg_refreshed'):
+            return False
+        try:
+            if time.time() - os.path.getmtime(stamp) < ttl:
+                __context__['phystack.pkg_refreshed'] = True
+                return False
+        except OSError:
+            pass
+
+    log.debug('Refreshing the package metadata')
+    __salt__['pkg.refresh_db']()
+    __context__['phystack.pkg_refreshed'] = True
+    with salt.utils.fopen(stamp, 'w'):
+        pass
+    return True
+
+
+def pkg_outdated(pkgs, latest=True):
+    '''
+    Return the packages of ``pkgs`` that are not installed or, with
+    ``latest``, older than the version available in the package metadata
+    already cached, as a dictionary of their installed and available
+    versions
+
+    CLI Example:
+
+    .. code-block:: bash
+
+        salt '*' phystack.pkg_outdated '[httpd, mod_wsgi]'
+    '''
+    if not pkgs:
+        return {}
+    installed = __salt__['pkg.version'](*pkgs)
+    available = __salt__['pkg.latest_version'](*pkgs, refresh=False)
+    if len(pkgs) == 1:
+        installed = {pkgs[0]: installed}
+        available = {pkgs[0]: available}
+
+    ret = {}
+    for name in pkgs:
+        # latest_version is empty for packages already at the latest version
+        if not installed.get(name) or (latest and available.get(name)):
+            ret[name] = {'installed': installed.get(name) or None,
+                         'available': available.get(name) or None}
+    return ret
+
+
+# files of the salt cache on salt-ssh targets that hold rendered states,
+# pillar data or results, relative to the cachedir
+_SECRETS = ['sls.p', 'highstate.p', 'highstate.cache.p', 'pillar',
+            'accumulator', 'minions']
+
+
+def wipe_secrets(paths=None):
+    '''
+    Remove the cached files that may hold secrets from the salt cache of a
+    salt-ssh target, keeping the thin and the custom modules so that the
+    next run does not upload them again. Returns the removed paths.
+
+    paths
+        The paths to remove, relative to the cachedir; by default rendered
+        states, pillar data and state results. State tarballs left in the
+        thin directory are always removed.
+
+    CLI Example:
+
+    .. code-block:: bash
+
+        salt-ssh '*' phystack.wipe_secrets
+    '''
+    cachedir = __opts__['cachedir']
+    targets = [os.path.join(cachedir, path) for path in paths or _SECRETS]
+    thin_dir = __opts__.get('thin_dir')
+    if thin_dir and os.path.isdir(thin_dir):
+        targets.extend(os.path.join(thin_dir, path)
+                       for path in os.listdir(thin_dir)
+                       if path.endswith('.tgz'))
+
+    removed = []
+    for path in targets:
+        if os.path.isdir(path) and not os.path.islink(path):
+            shutil.rmtree(path, ignore_errors=True)
+        elif os.path.lexists(path):
+            os.remove(path)
+        else:
+            continue
+        removed.append(path)
+    return removed
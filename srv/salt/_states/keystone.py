@@ -67,6 +67,13 @@ Management of Keystone users
 
 '''
 
+# Import Salt libs
+try:
+    from salt.utils.decorators.signature import identical_signature_wrapper
+except ImportError:
+    # salt < 2017.7
+    from salt.utils.decorators import identical_signature_wrapper
+
 
 def __virtual__():
     '''
@@ -75,6 +82,21 @@ def __virtual__():
     return 'keystone' if 'keystone.auth' in __salt__ else False
 
 
+def _traced(func):
+    '''
+    Decorate a state function to run in a keystone trace span, see
+    :py:func:`keystone.trace_timeline <salt.modules.keystone.trace_timeline>`
+    '''
+    span = 'state.keystone.' + func.__name__
+
+    def wrapped(*args, **kwargs):
+        with __salt__['keystone.trace_span'](
+                span, id=args[0] if args else kwargs.get('name')):
+            return func(*args, **kwargs)
+    return identical_signature_wrapper(func, wrapped)
+
+
+@_traced
 def user_present(name,
                  password,
                  email,
@@ -99,6 +121,9 @@ def user_present(name,
     project
         The project for this user
 
+    domain
+        The domain of this user and of the projects it refers to
+
     enabled
         Availability state for this user
 
@@ -161,7 +186,8 @@ def user_present(name,
         if roles:
             for project in roles.keys():
                 args = dict({'user_name': name, 'project_name':
-                             project, 'profile': profile}, **connection_args)
+                             project, 'domain': domain, 'profile': profile},
+                            **connection_args)
                 project_roles = __salt__['keystone.user_role_list'](**args)
                 for role in roles[project]:
                     if role not in project_roles:
@@ -174,6 +200,7 @@ def user_present(name,
                             continue
                         addargs = dict({'user': name, 'role': role,
                                         'project': project,
+                                        'domain': domain,
                                         'profile': profile},
                                        **connection_args)
                         newrole = __salt__['keystone.user_role_add'](**addargs)
@@ -192,6 +219,7 @@ def user_present(name,
                         continue
                     addargs = dict({'user': name, 'role': role,
                                     'project': project,
+                                    'domain': domain,
                                     'profile': profile},
                                    **connection_args)
                     oldrole = __salt__['keystone.user_role_remove'](**addargs)
@@ -210,6 +238,7 @@ def user_present(name,
                                          password=password,
                                          email=email,
                                          project_id=project_id,
+                                         domain=domain,
                                          enabled=enabled,
                                          profile=profile,
                                          **connection_args)
@@ -219,6 +248,7 @@ def user_present(name,
                     __salt__['keystone.user_role_add'](user=name,
                                                        role=role,
                                                        project=project,
+                                                       domain=domain,
                                                        profile=profile,
                                                        **connection_args)
         ret['comment'] = 'Keystone user {0} has been added'.format(name)
@@ -227,12 +257,175 @@ def user_present(name,
     return ret
 
 
-def user_absent(name, profile=None, **connection_args):
+@_traced
+def users_present(name, users, email=None, domain=None,
+                  reset_passwords=False, profile=None, **connection_args):
+    '''
+    Ensure that a batch of keystone users are present with the specified
+    properties. Users, projects and roles are read with one listing each,
+    role assignments with one listing per project users get roles on, and
+    only drifted users get requests.
+
+    name
+        An arbitrary name for this batch
+
+    users
+        A list of users, or a dictionary whose values are users. Each user
+        is a dictionary with a ``name`` and ``password``, and optionally
+        ``email``, ``project``, ``enabled`` and ``roles`` as for
+        ``user_present``, i.e.::
+
+            users:
+              - name: nova
+                password: '$up3rn0v4'
+                project: service
+                roles:
+                  service:
+                    - admin
+
+    email
+        The email address of users that do not set their own
+
+    domain
+        The domain of the users and of the projects they refer to
+
+    reset_passwords
+        Passwords are only set when creating users, unless this is True
+    '''
+    ret = {'name': name,
+           'changes': {},
+           'result': True,
+           'comment': 'All users are in the correct state'}
+    test = __opts__['test']
+    args = dict(connection_args, profile=profile)
+
+    existing = __salt__['keystone.user_list'](domain=domain, **args)
+    projects = __salt__['keystone.project_list'](domain=domain, **args)
+    roles = __salt__['keystone.role_list'](**args)
+    for listing in (existing, projects, roles):
+        if 'Error' in listing:
+            ret['result'] = False
+            ret['comment'] = listing['Error']
+            return ret
+    role_names = dict((role['id'], role_name)
+                      for role_name, role in roles.items())
+
+    if isinstance(users, dict):
+        users = list(users.values())
+
+    # only the assignments on projects users get roles on are compared
+    assignments = __salt__['keystone.role_assignment_list'](
+        project_id=sorted(set(projects[project]['id'] for user in users
+                              for project in user.get('roles') or {}
+                              if project in projects)),
+        **args)
+
+    errors = []
+    for user in users:
+        user_name = user['name']
+        changes = {}
+
+        project_id = None
+        if user.get('project'):
+            if user['project'] not in projects:
+                errors.append('Tenant "{0}" of user "{1}" does not exist'
+                              .format(user['project'], user_name))
+                continue
+            project_id = projects[user['project']]['id']
+
+        current = existing.get(user_name)
+        if current is None:
+            changes['User'] = 'Will be created' if test else 'Created'
+            user_id = None
+            if not test:
+                created = __salt__['keystone.user_create'](
+                    name=user_name,
+                    password=user['password'],
+                    email=user.get('email', email),
+                    project_id=project_id,
+                    domain=domain,
+                    enabled=user.get('enabled', True),
+                    **args)
+                user_id = created[user_name]['id']
+        else:
+            user_id = current['id']
+            update = {}
+            if current['email'] != user.get('email', email):
+                update['email'] = user.get('email', email)
+                changes['Email'] = 'Will be updated' if test else 'Updated'
+            if current['enabled'] != user.get('enabled', True):
+                update['enabled'] = user.get('enabled', True)
+                changes['Enabled'] = '{0} {1}'.format(
+                    'Will be' if test else 'Now', update['enabled'])
+            if project_id and current.get('project_id') != project_id:
+                update['project'] = user['project']
+                changes['Tenant'] = '{0} "{1}"'.format(
+                    'Will be' if test else 'Now', user['project'])
+            if reset_passwords:
+                update['password'] = user['password']
+                changes['Password'] = 'Will be reset' if test else 'Reset'
+            if update and not test:
+                __salt__['keystone.user_update'](user_id=user_id,
+                                                 domain=domain,
+                                                 **dict(args, **update))
+
+        for project, wanted in (user.get('roles') or {}).items():
+            if project not in projects:
+                errors.append('Tenant "{0}" of user "{1}" does not exist'
+                              .format(project, user_name))
+                continue
+            missing = [role for role in wanted if role not in roles]
+            if missing:
+                errors.append('Roles {0} of user "{1}" do not exist'
+                              .format(missing, user_name))
+                continue
+            pid = projects[project]['id']
+            current_roles = dict((role_names.get(role_id, role_id), role_id)
+                                 for role_id in
+                                 assignments.get(user_id, {}).get(pid, []))
+            for role in sorted(set(wanted) - set(current_roles)):
+                if test:
+                    changes.setdefault('roles', []).append(role)
+                    continue
+                changes.setdefault('roles', []).append(
+                    __salt__['keystone.user_role_add'](
+                        user_id=user_id, user=user_name,
+                        project_id=pid, project=project,
+                        role_id=roles[role]['id'], role=role, **args))
+            for role in sorted(set(current_roles) - set(wanted)):
+                if test:
+                    changes.setdefault('roles', []).append(role)
+                    continue
+                changes.setdefault('roles', []).append(
+                    __salt__['keystone.user_role_remove'](
+                        user_id=user_id, user=user_name,
+                        project_id=pid, project=project,
+                        role_id=current_roles[role], role=role, **args))
+
+        if changes:
+            ret['changes'][user_name] = changes
+
+    if ret['changes']:
+        ret['comment'] = '{0} user(s) {1}'.format(
+            len(ret['changes']), 'will be updated' if test else 'updated')
+        if test:
+            ret['result'] = None
+    if errors:
+        ret['result'] = False
+        ret['comment'] = '\n'.join([ret['comment']] + errors)
+    return ret
+
+
+@_traced
+def user_absent(name, domain=None, profile=None, **connection_args):
     '''
     Ensure that the keystone user is absent.
 
     name
         The name of the user that should not exist
+
+    domain
+        The domain of the user
     '''
     ret = {'name': name,
            'changes': {},
@@ -240,8 +433,8 @@ def user_absent(name, profile=None, **connection_args):
            'comment': 'User "{0}" is already absent'.format(name)}
 
     # Check if user is present
-    user = __salt__['keystone.user_get'](name=name, profile=profile,
-                                         **connection_args)
+    user = __salt__['keystone.user_get'](name=name, domain=domain,
+                                         profile=profile, **connection_args)
     if 'Error' not in user:
         if __opts__['test']:
             ret['result'] = None
@@ -249,14 +442,138 @@ def user_absent(name, profile=None, **connection_args):
             ret['changes']['User'] = 'Will be deleted'
             return ret
         # Delete that user!
-        __salt__['keystone.user_delete'](name=name, profile=profile,
-                                         **connection_args)
+        __salt__['keystone.user_delete'](user_id=user[name]['id'],
+                                         profile=profile, **connection_args)
         ret['comment'] = 'User "{0}" has been deleted'.format(name)
         ret['changes']['User'] = 'Deleted'
 
     return ret
 
 
+def _deleted(ret, kind, deleted):
+    '''
+    Fill a state return from the result of ``keystone.users_delete`` or
+    ``keystone.projects_delete``, ``kind`` being ``user`` or ``project``
+    '''
+    if 'Error' in deleted:
+        ret['result'] = False
+        ret['comment'] = deleted['Error']
+        return ret
+    if not deleted['deleted']:
+        return ret
+
+    # projects are still called tenants in the changes of these states
+    label = 'Tenant' if kind == 'project' else kind.title()
+    errors = []
+    for name, result in sorted(deleted['deleted'].items()):
+        if isinstance(result, dict):
+            errors.append('{0} "{1}": {2}'.format(label, name,
+                                                  result['Error']))
+        else:
+            ret['changes'][name] = {label: result}
+    count = len(ret['changes'])
+    if deleted.get('cleanup'):
+        errors.extend(deleted['cleanup'].pop('errors', []))
+        ret['changes']['cleanup'] = deleted['cleanup']
+    if __opts__['test']:
+        ret['result'] = None
+        ret['comment'] = '{0} {1}(s) will be deleted'.format(
+            deleted.get('count', count), kind)
+        return ret
+    ret['comment'] = '{0} {1}(s) have been deleted'.format(count, kind)
+    if errors:
+        ret['result'] = False
+        ret['comment'] = '\n'.join([ret['comment']] + errors)
+    return ret
+
+
+@_traced
+def users_absent(name, names=None, patterns=None, protected=None,
+                 domain=None, concurrency=10, profile=None,
+                 **connection_args):
+    '''
+    Ensure that a batch of keystone users are absent, given by name or
+    shell style pattern, with one listing and concurrent deletions, see
+    :py:func:`keystone.users_delete <salt.modules.keystone.users_delete>`
+
+    name
+        An arbitrary name for this batch
+
+    names
+        The names of the users that should not exist
+
+    patterns
+        Shell style patterns of the names of users that should not exist
+
+    protected
+        Names or shell style patterns of users never deleted
+
+    domain
+        The domain of the users
+
+    concurrency
+        The number of requests in flight at once
+    '''
+    ret = {'name': name,
+           'changes': {},
+           'result': True,
+           'comment': 'All users are already absent'}
+    return _deleted(ret, 'user', __salt__['keystone.users_delete'](
+        names=names, patterns=patterns, protected=protected, domain=domain,
+        concurrency=concurrency, test=__opts__['test'], profile=profile,
+        **connection_args))
+
+
+@_traced
+def users_pruned(name, users, protected=None, domain=None, concurrency=10,
+                 profile=None, **connection_args):
+    '''
+    Ensure that a domain holds no user besides the managed ones, deleting
+    the others concurrently after one listing. Run it with ``test=True``
+    to get the number of users that would be deleted.
+
+    .. code-block:: yaml
+
+        keystone unmanaged users:
+          keystone.users_pruned:
+            - users:
+              - admin
+              - nova
+            - protected:
+              - admin
+              - svc-*
+
+    name
+        An arbitrary name for this batch
+
+    users
+        The managed users: a list of names, or of users as for
+        ``users_present``, or a dictionary whose values are users
+
+    protected
+        Names or shell style patterns of users never deleted
+
+    domain
+        The domain of the users
+
+    concurrency
+        The number of requests in flight at once
+    '''
+    ret = {'name': name,
+           'changes': {},
+           'result': True,
+           'comment': 'No unmanaged users'}
+    if isinstance(users, dict):
+        users = list(users.values())
+    keep = [user['name'] if isinstance(user, dict) else user
+            for user in users]
+    return _deleted(ret, 'user', __salt__['keystone.users_delete'](
+        keep=keep, protected=protected, domain=domain,
+        concurrency=concurrency, test=__opts__['test'], profile=profile,
+        **connection_args))
+
+
+@_traced
 def project_present(name, description=None, enabled=True, domain=None,
                     profile=None, **connection_args):
     '''
@@ -278,38 +595,27 @@ def project_present(name, description=None, enabled=True, domain=None,
 
     # Check if project is already present
     project = __salt__['keystone.project_get'](name=name,
+                                             domain=domain,
                                              profile=profile,
                                              **connection_args)
 
     if 'Error' not in project:
-        if project[name]['description'] != description:
-            if __opts__['test']:
-                ret['result'] = None
-                ret['comment'] = 'Tenant "{0}" will be updated'.format(name)
-                ret['changes']['Description'] = 'Will be updated'
-                return ret
-            __salt__['keystone.project_update'](name=name,
-                                               domain=domain,
-                                               description=description,
-                                               enabled=enabled,
-                                               profile=profile,
-                                               **connection_args)
-            ret['comment'] = 'Tenant "{0}" has been updated'.format(name)
-            ret['changes']['Description'] = 'Updated'
-        if project[name]['enabled'] != enabled:
-            if __opts__['test']:
-                ret['result'] = None
-                ret['comment'] = 'Tenant "{0}" will be updated'.format(name)
-                ret['changes']['Enabled'] = 'Will be {0}'.format(enabled)
-                return ret
-            __salt__['keystone.project_update'](name=name,
-                                               domain=domain,
-                                               description=description,
-                                               enabled=enabled,
-                                               profile=profile,
-                                               **connection_args)
-            ret['comment'] = 'Tenant "{0}" has been updated'.format(name)
-            ret['changes']['Enabled'] = 'Now {0}'.format(enabled)
+        fields = _project_drift(project[name], description, enabled)
+        if not fields:
+            return ret
+        if __opts__['test']:
+            ret['result'] = None
+            ret['comment'] = 'Tenant "{0}" will be updated'.format(name)
+            ret['changes'] = _project_drift_changes(fields, test=True)
+            return ret
+        __salt__['keystone.project_update'](
+            project_id=project[name]['id'],
+            description=fields.get('description'),
+            enabled=fields.get('enabled'),
+            profile=profile,
+            **connection_args)
+        ret['comment'] = 'Tenant "{0}" has been updated'.format(name)
+        ret['changes'] = _project_drift_changes(fields)
     else:
         if __opts__['test']:
             ret['result'] = None
@@ -328,12 +634,117 @@ def project_present(name, description=None, enabled=True, domain=None,
     return ret
 
 
-def project_absent(name, profile=None, **connection_args):
+@_traced
+def projects_present(name, projects, domain=None, profile=None,
+                     **connection_args):
+    '''
+    Ensures that a batch of keystone projects exist. Existing projects are
+    read with a single listing and each drifted project gets one update.
+
+    name
+        An arbitrary name for this batch
+
+    projects
+        A list of projects, each a dictionary with a ``name`` and optional
+        ``description`` and ``enabled`` keys, i.e.::
+
+            projects:
+              - name: admin
+                description: Admin Project
+              - name: demo
+                enabled: False
+    '''
+    ret = {'name': name,
+           'changes': {},
+           'result': True,
+           'comment': 'All projects are in the correct state'}
+
+    existing = __salt__['keystone.project_list'](domain=domain,
+                                                 profile=profile,
+                                                 **connection_args)
+
+    created, updated = [], []
+    for project in projects:
+        if not isinstance(project, dict):
+            project = {'name': project}
+        project_name = project['name']
+        description = project.get('description')
+        enabled = project.get('enabled', True)
+
+        if project_name not in existing:
+            created.append(project_name)
+            if __opts__['test']:
+                ret['changes'][project_name] = {'Tenant': 'Will be created'}
+                continue
+            __salt__['keystone.project_create'](project_name,
+                                               domain=domain,
+                                               description=description,
+                                               enabled=enabled,
+                                               profile=profile,
+                                               **connection_args)
+            ret['changes'][project_name] = {'Tenant': 'Created'}
+            continue
+
+        fields = _project_drift(existing[project_name], description, enabled)
+        if not fields:
+            continue
+        updated.append(project_name)
+        if __opts__['test']:
+            ret['changes'][project_name] = _project_drift_changes(fields,
+                                                                  test=True)
+            continue
+        __salt__['keystone.project_update'](
+            project_id=existing[project_name]['id'],
+            description=fields.get('description'),
+            enabled=fields.get('enabled'),
+            profile=profile,
+            **connection_args)
+        ret['changes'][project_name] = _project_drift_changes(fields)
+
+    if created or updated:
+        verb = 'will be' if __opts__['test'] else 'have been'
+        ret['comment'] = '{0} project(s) {1} added, {2} {1} updated'.format(
+            len(created), verb, len(updated))
+        if __opts__['test']:
+            ret['result'] = None
+    return ret
+
+
+def _project_drift(current, description, enabled):
+    '''
+    Return the project fields that differ from the desired state
+    '''
+    fields = {}
+    if description is not None and current['description'] != description:
+        fields['description'] = description
+    if current['enabled'] != enabled:
+        fields['enabled'] = enabled
+    return fields
+
+
+def _project_drift_changes(fields, test=False):
+    '''
+    Describe project field updates in the usual state changes format
+    '''
+    changes = {}
+    if 'description' in fields:
+        changes['Description'] = 'Will be updated' if test else 'Updated'
+    if 'enabled' in fields:
+        changes['Enabled'] = '{0} {1}'.format('Will be' if test else 'Now',
+                                              fields['enabled'])
+    return changes
+
+
+@_traced
+def project_absent(name, domain=None, profile=None, **connection_args):
     '''
     Ensure that the keystone project is absent.
 
     name
         The name of the project that should not exist
+
+    domain
+        The domain of the project
     '''
     ret = {'name': name,
            'changes': {},
@@ -342,6 +753,7 @@ def project_absent(name, profile=None, **connection_args):
 
     # Check if project is present
     project = __salt__['keystone.project_get'](name=name,
+                                             domain=domain,
                                              profile=profile,
                                              **connection_args)
     if 'Error' not in project:
@@ -351,7 +763,8 @@ def project_absent(name, profile=None, **connection_args):
             ret['changes']['Tenant'] = 'Will be deleted'
             return ret
         # Delete project
-        __salt__['keystone.project_delete'](name=name, profile=profile,
+        __salt__['keystone.project_delete'](project_id=project[name]['id'],
+                                           profile=profile,
                                            **connection_args)
         ret['comment'] = 'Tenant "{0}" has been deleted'.format(name)
         ret['changes']['Tenant'] = 'Deleted'
@@ -359,6 +772,53 @@ def project_absent(name, profile=None, **connection_args):
     return ret
 
 
+@_traced
+def projects_absent(name, names=None, patterns=None, domain=None,
+                    cascade=False, concurrency=10, profile=None,
+                    **connection_args):
+    '''
+    Ensure that a batch of keystone projects are absent, given by name or
+    shell style pattern, with one listing and concurrent deletions, see
+    :py:func:`keystone.projects_delete <salt.modules.keystone.projects_delete>`
+
+    .. code-block:: yaml
+
+        ci projects:
+          keystone.projects_absent:
+            - patterns:
+              - ci-*
+            - cascade: True
+
+    name
+        An arbitrary name for this batch
+
+    names
+        The names of the projects that should not exist
+
+    patterns
+        Shell style patterns of the names of projects that should not exist
+
+    domain
+        The domain of the projects
+
+    cascade
+        Also revoke the role assignments on the projects and delete their
+        EC2 credentials
+
+    concurrency
+        The number of requests in flight at once
+    '''
+    ret = {'name': name,
+           'changes': {},
+           'result': True,
+           'comment': 'All projects are already absent'}
+    return _deleted(ret, 'project', __salt__['keystone.projects_delete'](
+        names=names, patterns=patterns, domain=domain, cascade=cascade,
+        concurrency=concurrency, test=__opts__['test'], profile=profile,
+        **connection_args))
+
+
+@_traced
 def role_present(name, profile=None, **connection_args):
     ''''
     Ensures that the keystone role exists
@@ -391,6 +851,42 @@ def role_present(name, profile=None, **connection_args):
     return ret
 
 
+@_traced
+def roles_present(name, roles, profile=None, **connection_args):
+    '''
+    Ensures that a batch of keystone roles exist, with a single listing
+
+    name
+        An arbitrary name for this batch
+
+    roles
+        The names of the roles that should be present
+    '''
+    ret = {'name': name,
+           'changes': {},
+           'result': True,
+           'comment': 'All roles already exist'}
+
+    existing = __salt__['keystone.role_list'](profile=profile,
+                                              **connection_args)
+    missing = [role for role in roles if role not in existing]
+    if not missing:
+        return ret
+    if __opts__['test']:
+        ret['result'] = None
+        ret['comment'] = '{0} role(s) will be added'.format(len(missing))
+        for role in missing:
+            ret['changes'][role] = {'Role': 'Will be created'}
+        return ret
+    for role in missing:
+        __salt__['keystone.role_create'](role, profile=profile,
+                                         **connection_args)
+        ret['changes'][role] = {'Role': 'Created'}
+    ret['comment'] = '{0} role(s) have been added'.format(len(missing))
+    return ret
+
+
+@_traced
 def role_absent(name, profile=None, **connection_args):
     '''
     Ensure that the keystone role is absent.
@@ -421,6 +917,7 @@ def role_absent(name, profile=None, **connection_args):
     return ret
 
 
+@_traced
 def service_present(name, service_type, description=None,
                     profile=None, **connection_args):
     '''
@@ -463,6 +960,7 @@ def service_present(name, service_type, description=None,
     return ret
 
 
+@_traced
 def service_absent(name, profile=None, **connection_args):
     '''
     Ensure that the service doesn't exist in Keystone catalog
@@ -495,6 +993,7 @@ def service_absent(name, profile=None, **connection_args):
     return ret
 
 
+@_traced
 def endpoint_present(name,
                      publicurl=None,
                      internalurl=None,
@@ -564,6 +1063,7 @@ def endpoint_present(name,
     return ret
 
 
+@_traced
 def endpoint_absent(name, profile=None, **connection_args):
     '''
     Ensure that the endpoint for a service doesn't exist in Keystone catalog
@@ -595,3 +1095,343 @@ def endpoint_absent(name, profile=None, **connection_args):
         ret['comment'] = 'Endpoint for service "{0}" has been deleted'.format(name)
         ret['changes']['endpoint'] = 'Deleted'
     return ret
+
+
+@_traced
+def bootstrapped(name, password=None, username='admin',
+                 project='admin', role='admin', region='RegionOne',
+                 admin_url='http://localhost:35357/v3',
+                 internal_url='http://localhost:5000/v3',
+                 public_url='http://localhost:5000/v3', roles=None,
+                 projects=None, users=None, services=None, endpoints=None,
+                 email=None, concurrency=10, profile=None,
+                 **connection_args):
+    '''
+    Seed an empty keystone quickly: the admin project, user, role and the
+    identity service locally with
+    :py:func:`keystone.bootstrap <salt.modules.keystone.bootstrap>`, then
+    the other roles, projects, users, services and endpoints with
+    :py:func:`keystone.bulk_create <salt.modules.keystone.bulk_create>`.
+    Nothing is done once keystone holds a role, the ``*_present`` states
+    maintain it from then on.
+
+    name
+        An arbitrary name for this state
+
+    password
+        The password of the admin user. Without it, or with a keystone-manage
+        without ``bootstrap`` (before Mitaka), only ``keystone.bulk_create``
+        runs, with the admin token.
+
+    Other arguments are those of ``keystone.bootstrap`` and
+    ``keystone.bulk_create``.
+    '''
+    ret = {'name': name,
+           'changes': {},
+           'result': True,
+           'comment': 'Keystone is already bootstrapped'}
+    args = dict(connection_args, profile=profile)
+    if not __salt__['keystone.is_empty'](**args):
+        return ret
+    if __opts__['test']:
+        ret['result'] = None
+        ret['comment'] = 'Keystone will be bootstrapped'
+        return ret
+
+    seeded = None
+    if password and __salt__['keystone.bootstrap_supported']():
+        seeded = __salt__['keystone.bootstrap'](
+            password, username=username, project=project, role=role,
+            region=region, admin_url=admin_url, internal_url=internal_url,
+            public_url=public_url)
+        if 'Error' in seeded:
+            ret['result'] = False
+            ret['comment'] = seeded['Error']
+            return ret
+        ret['changes']['bootstrap'] = seeded
+
+    created = __salt__['keystone.bulk_create'](
+        roles=roles, projects=projects, users=users, services=services,
+        endpoints=endpoints, email=email, concurrency=concurrency, **args)
+    if 'Error' in created:
+        ret['result'] = False
+        ret['comment'] = created['Error']
+        return ret
+    ret['changes'].update(created['created'])
+    ret['comment'] = '{0} objects created in {1}s'.format(
+        sum(len(names) for names in created['created'].values()),
+        round(sum(created['seconds'].values()), 3))
+    if seeded:
+        ret['comment'] = 'Keystone bootstrapped in {0}s, then {1}'.format(
+            seeded['seconds'], ret['comment'])
+    if created['errors']:
+        ret['result'] = False
+        ret['comment'] = '\n'.join([ret['comment']] + created['errors'])
+    return ret
+
+
+@_traced
+def db_synced(name):
+    '''
+    Ensure that the keystone database schema is at the head of the installed
+    keystone, running only the migration phases still needed. A package
+    update that did not bring new migrations does not touch the database.
+
+    .. code-block:: yaml
+
+        keystone sync database:
+          keystone.db_synced:
+            - require:
+              - phystack: keystone packages
+
+    name
+        An arbitrary name for this state
+    '''
+    ret = {'name': name,
+           'changes': {},
+           'result': True,
+           'comment': ''}
+    check = __salt__['keystone.db_sync_check']()
+    if 'Error' in check:
+        ret['result'] = False
+        ret['comment'] = check['Error']
+        return ret
+    if not check['phases']:
+        ret['comment'] = 'Keystone database is at version {0}, nothing to '\
+            'migrate'.format(check['version'])
+        return ret
+    if __opts__['test']:
+        ret['result'] = None
+        ret['comment'] = 'Keystone database migrations will run: {0}'.format(
+            ', '.join(check['phases']))
+        return ret
+
+    sync = __salt__['keystone.db_sync'](phases=check['phases'])
+    ret['changes'] = {'version': {'old': sync['old'], 'new': sync['new']},
+                      'phases': sync['phases']}
+    timings = ', '.join('{0} {1}s'.format(phase, seconds)
+                        for phase, seconds in sync['phases'].items())
+    if 'Error' in sync:
+        ret['result'] = False
+        ret['comment'] = '{0} ({1})'.format(sync['Error'], timings)
+        return ret
+    ret['comment'] = 'Keystone database migrated to version {0} ({1})'.format(
+        sync['new'], timings)
+    return ret
+
+
+@_traced
+def memcache_reachable(name, servers, timeout=3):
+    '''
+    Ensure that the memcached servers keystone caches in answer
+
+    name
+        An arbitrary name for this state
+
+    servers
+        A list of ``host:port`` memcached servers
+    '''
+    ret = {'name': name,
+           'changes': {},
+           'result': True,
+           'comment': ''}
+    versions = __salt__['keystone.memcache_check'](servers, timeout=timeout)
+    down = sorted(server for server, version in versions.items()
+                  if not version)
+    if down:
+        ret['result'] = False
+        ret['comment'] = 'memcached is not reachable on {0}'.format(
+            ', '.join(down))
+    else:
+        ret['comment'] = 'memcached is reachable on {0}'.format(
+            ', '.join(sorted(versions)))
+    return ret
+
+
+@_traced
+def wait_ready(name, urls=None, timeout=120, max_latency=1, warm=0):
+    '''
+    Wait for the keystone endpoints to answer quickly before the states
+    calling the keystone API, e.g. right after httpd was restarted, see
+    :py:func:`keystone.wait_ready <salt.modules.keystone.wait_ready>`
+
+    .. code-block:: yaml
+
+        keystone ready:
+          keystone.wait_ready:
+            - max_latency: 0.5
+            - warm: 8
+
+        keystone roles:
+          keystone.roles_present:
+            - roles:
+              - admin
+            - require:
+              - keystone: keystone ready
+
+    name
+        An arbitrary name for this state
+
+    urls
+        The endpoints to wait for, by default the public and admin v3 ones
+
+    timeout
+        How long to wait, in seconds
+
+    max_latency
+        The response time, in seconds, under which an endpoint is ready
+
+    warm
+        The number of concurrent requests to send to each endpoint first,
+        to spawn all of its WSGI processes
+    '''
+    ret = {'name': name,
+           'changes': {},
+           'result': True,
+           'comment': ''}
+    if __opts__['test']:
+        ret['result'] = None
+        ret['comment'] = 'Keystone endpoints will be waited for'
+        return ret
+    ready = __salt__['keystone.wait_ready'](urls=urls, timeout=timeout,
+                                            max_latency=max_latency,
+                                            warm=warm)
+    latencies = ', '.join('{0} {1}s'.format(url, endpoint['latency'])
+                          for url, endpoint
+                          in sorted(ready['endpoints'].items()))
+    if 'Error' in ready:
+        ret['result'] = False
+        ret['comment'] = '{0} ({1})'.format(ready['Error'], latencies)
+        return ret
+    ret['comment'] = 'Keystone is ready after {0}s ({1})'.format(
+        ready['seconds'], latencies)
+    return ret
+
+
+@_traced
+def wsgi_reloaded(name, method='touch', scripts=None, urls=None, timeout=60):
+    '''
+    Recycle the keystone WSGI processes when a watched state changes, then
+    wait for the keystone endpoints to be healthy. Without changes in the
+    watched states, nothing is done.
+
+    .. code-block:: yaml
+
+        keystone wsgi reload:
+          keystone.wsgi_reloaded:
+            - method: touch
+            - watch:
+              - sls: openstack.keystone.config
+
+    name
+        An arbitrary name for this state
+
+    method
+        ``touch`` to make mod_wsgi recycle the daemon processes, or
+        ``graceful`` to gracefully reload httpd, see
+        :py:func:`keystone.wsgi_reload <salt.modules.keystone.wsgi_reload>`
+
+    scripts
+        The WSGI scripts to touch
+
+    urls
+        The endpoints to wait for
+
+    timeout
+        How long to wait for the endpoints, in seconds
+    '''
+    return {'name': name,
+            'changes': {},
+            'result': True,
+            'comment': 'Keystone WSGI processes are only recycled on changes'}
+
+
+@_traced
+def mod_watch(name, sfun=None, **kwargs):
+    '''
+    Recycle the keystone WSGI processes on changes in watched states
+    '''
+    ret = {'name': name,
+           'changes': {},
+           'result': True,
+           'comment': ''}
+    if sfun != 'wsgi_reloaded':
+        ret['result'] = False
+        ret['comment'] = 'keystone.{0} does not work with the watch requisite'\
+            .format(sfun)
+        return ret
+
+    method = kwargs.get('method', 'touch')
+    if __opts__['test']:
+        ret['result'] = None
+        ret['comment'] = 'Keystone WSGI processes will be recycled ({0})'\
+            .format(method)
+        return ret
+
+    reload_ret = __salt__['keystone.wsgi_reload'](
+        method=method,
+        scripts=kwargs.get('scripts'),
+        urls=kwargs.get('urls'),
+        timeout=kwargs.get('timeout', 60))
+    if 'Error' in reload_ret:
+        ret['result'] = False
+        ret['comment'] = reload_ret['Error']
+        return ret
+    ret['changes'] = {'reloaded': reload_ret}
+    ret['comment'] = 'Keystone WSGI processes recycled ({0}), healthy after '\
+        '{1}s'.format(method, reload_ret['seconds'])
+    return ret
+
+
+@_traced
+def benchmarked(name, max_error_rate=0, output=None, **kwargs):
+    '''
+    Run :py:func:`keystone.bench <salt.modules.keystone.bench>` against the
+    local keystone and report its results as the changes of this state,
+    e.g. after a deploy to compare WSGI sizing and cache settings.
+
+    .. code-block:: yaml
+
+        keystone load bench:
+          keystone.benchmarked:
+            - requests: 2000
+            - concurrency: 20
+            - output: /var/tmp/keystone-bench.json
+
+    name
+        An arbitrary name for this state
+
+    max_error_rate
+        The fraction of failed requests above which the state fails
+
+    output
+        A file to also write the results to, as JSON
+
+    Other arguments are passed to ``keystone.bench``.
+    '''
+    ret = {'name': name,
+           'changes': {},
+           'result': True,
+           'comment': ''}
+    if __opts__['test']:
+        ret['result'] = None
+        ret['comment'] = 'Keystone will be benchmarked'
+        return ret
+
+    results = __salt__['keystone.bench'](output=output, **kwargs)
+    if 'Error' in results:
+        ret['result'] = False
+        ret['comment'] = results['Error']
+        return ret
+
+    ret['changes'] = results
+    comments = []
+    for operation, stats in sorted(results['operations'].items()):
+        comments.append('{0}: {1} req/s, p50 {2} ms, p95 {3} ms, p99 {4} ms, '
+                        '{5} errors'.format(operation, stats['throughput'],
+                                            stats['p50'], stats['p95'],
+                                            stats['p99'], stats['errors']))
+        if stats['errors'] > max_error_rate * stats['requests']:
+            ret['result'] = False
+    ret['comment'] = '\n'.join(comments)
+    return ret
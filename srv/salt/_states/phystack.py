@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+'''
+States shared by the phystack formulas
+======================================
+
+Compared to ``pkg.latest``, ``phystack.packages`` refreshes the package
+metadata at most once per run and only when it is older than
+``refresh_ttl`` seconds, does nothing when every package is already at the
+version of the cached metadata, and, with ``aggregate``, installs the
+packages of all ``phystack.packages`` states of the run in one transaction.
+
+.. code-block:: yaml
+
+    apache package:
+      phystack.packages:
+        - pkgs:
+          - httpd
+        - aggregate: True
+
+    package metadata:
+      phystack.metadata_refreshed:
+        - watch:
+          - pkg: openstack repository package
+
+``phystack.secrets_wiped`` removes the cached secrets from salt-ssh targets
+that keep their thin between runs.
+'''
+
+# Import Python libs
+from __future__ import absolute_import
+import json
+
+# Import Salt libs
+import salt.utils
+
+
+def packages(name, pkgs=None, latest=True, refresh_ttl=3600, **kwargs):
+    '''
+    Ensure that packages are installed, at their latest version unless
+    ``latest`` is False
+
+    name
+        The package to install, unless ``pkgs`` is given
+
+    pkgs
+        A list of packages to install
+
+    latest
+        Upgrade installed packages to the latest available version
+
+    refresh_ttl
+        Refresh the package metadata if it is older than this, in seconds
+
+    Other arguments are passed to ``pkg.latest`` or ``pkg.installed``.
+    '''
+    ret = {'name': name,
+           'changes': {},
+           'result': True,
+           'comment': ''}
+    pkgs = list(pkgs or [name])
+    if not __opts__['test']:
+        __salt__['phystack.pkg_refresh'](ttl=refresh_ttl)
+    outdated = __salt__['phystack.pkg_outdated'](pkgs, latest=latest)
+    if not outdated:
+        ret['comment'] = 'All packages are {0}: {1}'.format(
+            'up to date' if latest else 'installed', ', '.join(pkgs))
+        return ret
+
+    kwargs = dict((key, value) for key, value in kwargs.items()
+                  if not key.startswith('__'))
+    kwargs.pop('aggregate', None)
+    func = 'pkg.latest' if latest else 'pkg.installed'
+    # the up to date packages are left out of the transaction
+    return __states__[func](name=name, pkgs=sorted(outdated), refresh=False,
+                            **kwargs)
+
+
+def metadata_refreshed(name, ttl=3600):
+    '''
+    Refresh the package metadata if it is older than ``ttl`` seconds, or
+    unconditionally when a watched state changes, e.g. after adding a
+    repository
+
+    name
+        An arbitrary name for this state
+    '''
+    ret = {'name': name,
+           'changes': {},
+           'result': True,
+           'comment': 'Package metadata is fresh'}
+    if __opts__['test']:
+        return ret
+    if __salt__['phystack.pkg_refresh'](ttl=ttl):
+        ret['changes'] = {'refreshed': True}
+        ret['comment'] = 'Package metadata refreshed'
+    return ret
+
+
+def mod_watch(name, sfun=None, **kwargs):
+    '''
+    Force a package metadata refresh on changes in watched states
+    '''
+    ret = {'name': name,
+           'changes': {},
+           'result': True,
+           'comment': ''}
+    if sfun != 'metadata_refreshed':
+        ret['result'] = False
+        ret['comment'] = 'phystack.{0} does not work with the watch '\
+            'requisite'.format(sfun)
+        return ret
+    if __opts__['test']:
+        ret['result'] = None
+        ret['comment'] = 'Package metadata will be refreshed'
+        return ret
+    __salt__['phystack.pkg_refresh'](force=True)
+    ret['changes'] = {'refreshed': True}
+    ret['comment'] = 'Package metadata refreshed'
+    return ret
+
+
+_REQUISITES = ('require', 'watch', 'prereq', 'onchanges', 'onfail',
+               'listen', 'use')
+
+
+def _requisites(low):
+    '''
+    Return the requisites of a chunk in a comparable form
+    '''
+    return [(req, sorted(json.dumps(item, sort_keys=True)
+                         for item in low.get(req) or []))
+            for req in _REQUISITES]
+
+
+def mod_aggregate(low, chunks, running):
+    '''
+    Merge the packages of the ``phystack.packages`` states not run yet into
+    the first one, so that they are installed in one transaction. The
+    merged states then find their packages current and do nothing.
+
+    Only states with the same requisites are merged, so that no package is
+    installed before, e.g., the repository it comes from.
+    '''
+    if low.get('fun') != 'packages':
+        return low
+    tag = salt.utils.gen_state_tag(low)
+    requisites = _requisites(low)
+    pkgs = list(low.get('pkgs') or [low['name']])
+    for chunk in chunks:
+        if chunk.get('state') != 'phystack' \
+                or chunk.get('fun') != 'packages' or '__agg__' in chunk \
+                or salt.utils.gen_state_tag(chunk) in running \
+                or salt.utils.gen_state_tag(chunk) == tag \
+                or chunk.get('latest', True) != low.get('latest', True) \
+                or _requisites(chunk) != requisites:
+            continue
+        chunk['__agg__'] = True
+        for pkg in chunk.get('pkgs') or [chunk['name']]:
+            if pkg not in pkgs:
+                pkgs.append(pkg)
+    low['pkgs'] = pkgs
+    return low
+
+
+def secrets_wiped(name, paths=None):
+    '''
+    Remove the cached files that may hold secrets from a salt-ssh target
+    kept between runs, see
+    :py:func:`phystack.wipe_secrets <salt.modules.phystack.wipe_secrets>`.
+    Run it last; a failhard run stops before it, so bin/salt-deploy also
+    calls ``phystack.wipe_secrets`` after each run:
+
+    .. code-block:: yaml
+
+        salt cache secrets:
+          phystack.secrets_wiped:
+            - order: last
+
+    name
+        An arbitrary name for this state
+
+    paths
+        The paths to remove, relative to the cachedir
+    '''
+    ret = {'name': name,
+           'changes': {},
+           'result': True,
+           'comment': 'No cached secrets to remove'}
+    if __opts__['test']:
+        return ret
+    removed = __salt__['phystack.wipe_secrets'](paths=paths)
+    if removed:
+        ret['changes'] = {'removed': removed}
+        ret['comment'] = 'Removed {0} cached files'.format(len(removed))
+    return ret
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+'''
+salt-ssh wrapper of the phystack helpers that map files call while states
+are rendered.
+
+salt-ssh renders states on the master, where a call to the execution module
+would run on the target over ssh. Wrapper functions run on the master
+instead, so ``settings`` merges the pillar over the formula defaults there,
+once per target and run, with the implementation of the execution module.
+'''
+
+# Import Python libs
+from __future__ import absolute_import
+import imp
+import os
+import sys
+
+# Import Salt libs
+import salt.fileclient
+
+# the execution module, loaded from its source next to this directory
+_MODULE = 'salt_phystack_module'
+
+
+def _module():
+    if _MODULE not in sys.modules:
+        imp.load_source(_MODULE, os.path.join(
+            os.path.dirname(os.path.abspath(__file__)), os.pardir,
+            '_modules', 'phystack.py'))
+    return sys.modules[_MODULE]
+
+
+def settings(pillar_key, defaults, saltenv='base'):
+    '''
+    Return the pillar subtree at ``pillar_key`` merged over ``defaults``,
+    which is either a dictionary or the salt:// URL of a YAML file, read
+    from the master file server. See
+    :py:func:`phystack.settings <salt.modules.phystack.settings>`.
+
+    CLI Example:
+
+    .. code-block:: bash
+
+        salt-ssh '*' phystack.settings openstack:keystone salt://openstack/keystone/defaults.yml
+    '''
+    # the state wrapper keeps its file client here
+    if 'fileclient' not in __context__:
+        __context__['fileclient'] = salt.fileclient.FSClient(__opts__)
+    return _module()._merge_settings(
+        __context__, __context__['fileclient'].cache_file,
+        __salt__['pillar.get'], pillar_key, defaults, saltenv)
@@ -0,0 +1,98 @@
+#!/usr/bin/python
+# Managed by salt, see openstack/keystone/prune.sls
+'''
+Delete expired tokens and old revocation events from the keystone database
+in small batches, sleeping in between so that the tables are never locked
+for long, and print the table sizes before and after as JSON.
+'''
+from __future__ import print_function
+import argparse
+import json
+import sys
+import time
+
+import pymysql
+from six.moves import configparser
+from six.moves.urllib.parse import unquote, urlparse
+
+# table -> condition selecting the rows to delete, given the revocation age
+PRUNED = {
+    'token': 'expires < UTC_TIMESTAMP()',
+    'revocation_event':
+        'revoked_at < UTC_TIMESTAMP() - INTERVAL {age} SECOND',
+}
+
+
+def connect(config):
+    parser = configparser.RawConfigParser()
+    parser.read(config)
+    url = urlparse(parser.get('database', 'connection'))
+    return pymysql.connect(host=url.hostname or 'localhost',
+                           port=url.port or 3306,
+                           user=unquote(url.username or ''),
+                           passwd=unquote(url.password or ''),
+                           db=url.path.lstrip('/'),
+                           autocommit=True)
+
+
+def table_sizes(conn):
+    with conn.cursor() as cursor:
+        cursor.execute(
+            'SELECT table_name, table_rows, data_length + index_length '
+            'FROM information_schema.tables '
+            'WHERE table_schema = DATABASE() AND table_name IN %s',
+            (tuple(PRUNED),))
+        return dict((name, {'rows': int(rows or 0), 'bytes': int(size or 0)})
+                    for name, rows, size in cursor.fetchall())
+
+
+def prune(conn, table, condition, batch_size, sleep):
+    deleted = 0
+    while True:
+        with conn.cursor() as cursor:
+            count = cursor.execute('DELETE FROM {0} WHERE {1} LIMIT {2}'
+                                   .format(table, condition, batch_size))
+        deleted += count
+        if count < batch_size:
+            return deleted
+        time.sleep(sleep)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--config', default='/etc/keystone/keystone.conf')
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--sleep', type=float, default=1.0,
+                        help='seconds between batches')
+    parser.add_argument('--revocation-age', type=int, default=86400,
+                        help='seconds revocation events are kept, at least '
+                             'the token expiration')
+    parser.add_argument('--sizes', action='store_true',
+                        help='only report the table sizes')
+    args = parser.parse_args()
+
+    conn = connect(args.config)
+    ret = {'before': table_sizes(conn)}
+    if not args.sizes:
+        ret['deleted'] = {}
+        for table, condition in sorted(PRUNED.items()):
+            if table not in ret['before']:
+                continue
+            start = time.time()
+            ret['deleted'][table] = prune(
+                conn, table, condition.format(age=args.revocation_age),
+                args.batch_size, args.sleep)
+            ret.setdefault('duration', {})[table] = round(
+                time.time() - start, 3)
+        # ANALYZE TABLE without tables is a syntax error
+        if ret['deleted']:
+            with conn.cursor() as cursor:
+                cursor.execute('ANALYZE TABLE {0}'.format(
+                    ', '.join(sorted(ret['deleted']))))
+        ret['after'] = table_sizes(conn)
+    json.dump(ret, sys.stdout, sort_keys=True)
+    print()
+
+
+if __name__ == '__main__':
+    main()
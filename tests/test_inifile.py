@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+'''
+Tests of the inifile.options state rendering
+'''
+from __future__ import absolute_import
+import imp
+import os
+
+import pytest
+
+pytest.importorskip('salt.utils')
+
+inifile = imp.load_source(
+    'inifile', os.path.join(os.path.dirname(__file__), os.pardir,
+                            'srv', 'salt', '_states', 'inifile.py'))
+
+
+def _render(text, present=None, absent=()):
+    lines = text.splitlines(True)
+    return ''.join(inifile._render(inifile._parse(lines), present,
+                                   set(absent)))
+
+
+def test_new_option_after_last_line_without_newline():
+    assert _render('[a]\nx = 1', {'a': {'y': 2}}) == '[a]\nx = 1\ny = 2\n'
+
+
+def test_new_section_after_last_line_without_newline():
+    assert _render('[a]\nx = 1', {'b': {'y': 2}}) == \
+        '[a]\nx = 1\n\n[b]\ny = 2\n'
+
+
+def test_option_replaced_in_place():
+    assert _render('[a]\nx = 1\n\n[b]\n', {'a': {'x': 3}}) == \
+        '[a]\nx = 3\n\n[b]\n'
+
+
+def test_unchanged_file_kept():
+    text = '# comment\n[a]\nx = 1\n'
+    assert _render(text, {'a': {'x': 1}}) == text